@@ -0,0 +1,551 @@
+#!/usr/bin/env python
+
+# THIRD PARTY LIBRARIES
+import numpy as np
+import click
+
+# STANDARD PYTHON
+import asyncio
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from os.path import abspath, dirname, exists, join
+
+# LOCAL
+import pgalyzer
+
+# Synthetic Project Gutenberg files
+HERE = dirname(abspath(__file__))
+DATA_DIR = join(HERE, 'bench-data')
+VOCAB_SIZE = 50000
+ZIPF_EXPONENT = 1.07
+BLOCK_WORDS = 1 << 18
+COMMON = ('the of and to a in that he was it his is with as i had for you '
+          'at her not be on but my she him by which from this all so they '
+          'have were said one there me or an we what been no would when '
+          'are them if their could into then who will out up more your '
+          'some upon its very only now than about other time before our '
+          'little any man these like over made well after such two do '
+          'did down great much should must never old see can first how '
+          'whale mary lamb').split()
+SYLLABLES = ('ba be bi bo bu da de di do du fa fe fi fo ka ke ki ko la le '
+             'li lo lu ma me mi mo mu na ne ni no nu pa pe pi po ra re ri '
+             'ro ru sa se si so ta te ti to tu va ve vi wa we wi ya yo za '
+             'ch sh th st tr an en in on er or ar').split()
+
+# Files of the aload_many cases, read at a throttled rate (bytes/s)
+LOAD_FILES = 8
+READ_RATE = 10 << 20
+
+# Benchmark cases: name -> (method, args, kwargs)
+WORD = 'whale'
+PHRASE = 'of the'
+API_CASES = {
+    'PGalyzer': (None, (), {}),
+    'PGalyzer-clean': (None, (), {}),
+    'clean_pg_chunks': (None, (), {}),
+    'from_corpus': (None, (), {}),
+    'from_stream': (None, (), {}),
+    'export': (None, (), {}),
+    'from_export': (None, (), {}),
+    'append': (None, (), {}),
+    **{'aload_many-{}'.format(c): (None, (), {}) for c in (1, 4)},
+    'ngrams': ('ngrams', (1,), {}),
+    'ngrams-2': ('ngrams', (2,), {}),
+    'ngrams-3': ('ngrams', (3,), {}),
+    'ngrams-approx-3': ('ngrams', (3,), {'approx': True}),
+    'ngram_frame-2': ('ngram_frame', (2,), {}),
+    **{'ngrams-workers{}-3'.format(w): ('ngrams', (3,), {'workers': w})
+       for w in (2, 4, 8)},
+    'word_count': ('word_count', (), {}),
+    **{'word_count-workers{}'.format(w): ('word_count', (), {'workers': w})
+       for w in (2, 4, 8)},
+    'concordance': ('concordance', (WORD,), {}),
+    'concordance-phrase': ('concordance', (PHRASE,), {}),
+    'phrase_count': ('phrase_count', (PHRASE,), {}),
+    'display_concordance': ('display_concordance', (WORD,), {}),
+    'display_concordance-the': ('display_concordance', ('the',), {}),
+    'display_concordance-the-page': ('display_concordance', ('the',),
+                                     {'limit': 100, 'offset': 1000}),
+    'likely_next': ('likely_next', ('the',), {}),
+    **{'likely_next-workers{}'.format(w): ('likely_next', ('the',),
+                                           {'workers': w})
+       for w in (2, 4, 8)},
+    'likely_next-context': ('likely_next', (PHRASE,), {}),
+    'likely_previous': ('likely_previous', ('the',), {}),
+    'cooccurrence': ('cooccurrence', (), {}),
+    'collocations': ('collocations', (), {}),
+}
+CLI_CASES = {
+    'cli-main': ['main'],
+    'cli-ngrams': ['ngrams', '-n', '2'],
+    'cli-word-count': ['word-count'],
+    'cli-concordance': ['concordance', WORD],
+    'cli-concordance-phrase': ['concordance', PHRASE],
+    'cli-display-concordance': ['display-concordance', WORD],
+    'cli-display-concordance-the': ['display-concordance', 'the'],
+    'cli-likely-next': ['likely-next', 'the'],
+    'cli-likely-previous': ['likely-previous', 'the'],
+    'cli-collocations': ['collocations'],
+}
+
+
+def _parse_size(size):
+    """Return the number of bytes of a size such as `100K`, `5M` or `1G`."""
+    units = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30}
+    size = size.strip().upper().rstrip('B')
+    if size and size[-1] in units:
+        return int(float(size[:-1]) * units[size[-1]])
+    return int(size)
+
+
+def _vocabulary(size=VOCAB_SIZE):
+    """
+    Return `size` words, most frequent first: common English words,
+    then made-up words built from syllables.  The list is always the
+    same, whatever the seed of the generated file.
+    """
+    rng = np.random.default_rng(0)
+    words = list(COMMON)
+    seen = set(words)
+    while len(words) < size:
+        length = rng.integers(1, 5)
+        word = ''.join(SYLLABLES[i] for i in
+                       rng.integers(0, len(SYLLABLES), length))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    return words[:size]
+
+
+def _body_blocks(seed, vocab_size=VOCAB_SIZE, exponent=ZIPF_EXPONENT):
+    """
+    Yield blocks of the body of a synthetic book, forever.
+
+    Words are drawn from a Zipfian distribution over the vocabulary.
+    Sentences start with a capital and end with `.`, `?` or `!`, with
+    commas, semicolons, dashes, quotes and parentheses in between.
+    Lines hold 6 to 14 words and paragraphs 1 to 10 lines.  Every
+    block ends with a complete paragraph and a blank line.
+    """
+    rng = np.random.default_rng(seed)
+    vocab = np.array(_vocabulary(vocab_size), dtype=object)
+    capital = np.array([w.capitalize() for w in vocab], dtype=object)
+    weights = 1 / np.arange(1, vocab_size + 1) ** exponent
+    cdf = np.cumsum(weights / weights.sum())
+
+    while True:
+        n = BLOCK_WORDS
+        ids = np.minimum(np.searchsorted(cdf, rng.random(n)), vocab_size - 1)
+
+        # Sentences: capitalize the word after each full stop
+        ends = rng.random(n) < 1 / 14
+        starts = np.roll(ends, 1)
+        words = np.where(starts, capital[ids], vocab[ids])
+        stops = rng.choice(np.array(['.', '.', '.', '?', '!'],
+                                    dtype=object), n)
+        marks = rng.choice(np.array([',', ',', ',', ';', ':', ' --'],
+                                    dtype=object), n)
+        punctuation = np.where(ends, stops,
+                               np.where(rng.random(n) < 0.07, marks, ''))
+        words = words + punctuation
+
+        quoted = rng.random(n) < 0.01
+        words[quoted] = '"' + words[quoted]
+        bracketed = np.flatnonzero(rng.random(n) < 0.003)
+        words[bracketed] = '(' + words[bracketed] + ')'
+
+        # Separators: line breaks and blank lines between paragraphs
+        breaks = np.cumsum(rng.integers(6, 15, n // 6))
+        breaks = breaks[breaks < n - 1]
+        paragraphs = np.cumsum(rng.integers(1, 11, len(breaks)))
+        paragraphs = breaks[paragraphs[paragraphs < len(breaks)]]
+        separators = np.full(n, ' ', dtype=object)
+        separators[breaks] = '\n'
+        separators[paragraphs] = '\n\n'
+        last = paragraphs[-1] if len(paragraphs) else n - 1
+
+        pieces = np.empty(2 * (last + 1), dtype=object)
+        pieces[0::2] = words[:last + 1]
+        pieces[1::2] = separators[:last + 1]
+        pieces[-1] = '\n\n'
+        yield ''.join(pieces.tolist())
+
+
+def generate(path, size, seed=0, crlf=False):
+    """
+    Write a synthetic Project Gutenberg file of about `size` bytes.
+
+    The file has a header and a license footer around the
+    `*** START/END OF THIS PROJECT GUTENBERG EBOOK` markers, and a body
+    of paragraphs with punctuation and a Zipfian vocabulary.  The same
+    `size` and `seed` always give the same file.  It is written block
+    by block, so memory use does not depend on `size`.
+
+    Parameters
+    ----------
+    path: string
+        Filepath to write
+    size: int
+        Approximate size in bytes; the body is cut at a paragraph
+    seed: int
+        Seed of the random words
+    crlf: boolean
+        End lines with `\\r\\n`, as many Project Gutenberg files do
+    """
+    title = 'SYNTHETIC BOOK {}'.format(seed)
+    header = ('The Project Gutenberg EBook of Synthetic Book {0}, by '
+              'Benchmark\n\nThis eBook is for the use of anyone anywhere '
+              'at no cost and with\nalmost no restrictions whatsoever.\n\n'
+              'Title: Synthetic Book {0}\n\nLanguage: English\n\n'
+              '*** START OF THIS PROJECT GUTENBERG EBOOK {1} ***\n\n\n'
+              .format(seed, title))
+    footer = ('\n*** END OF THIS PROJECT GUTENBERG EBOOK {} ***\n\n'
+              '***** This file should be named synthetic.txt *****\n\n'
+              'Updated editions will replace the previous one--the old '
+              'editions\nwill be renamed.\n'.format(title))
+
+    newline = '\r\n' if crlf else '\n'
+    with open(path, 'w', newline=newline) as f:
+        f.write(header)
+        written = len(header) + len(footer)
+        for block in _body_blocks(seed):
+            if written + len(block) > size:
+                cut = block.rfind('\n\n', 0, max(size - written, 0))
+                f.write(block[:cut + 2] if cut >= 0 else '')
+                break
+            f.write(block)
+            written += len(block)
+        f.write(footer)
+
+
+def _data_file(data_dir, size, seed):
+    """Return the path of a synthetic file, generating it if needed."""
+    os.makedirs(data_dir, exist_ok=True)
+    path = join(data_dir, 'pg-synthetic-{}-{}.txt'.format(size, seed))
+    if not exists(path):
+        generate(path + '.tmp', size, seed)
+        os.replace(path + '.tmp', path)
+    return path
+
+
+def _peak_rss():
+    """Return the peak resident memory of this process in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1 << 20 if sys.platform == 'darwin' else 1 << 10)
+
+
+def _slow_read(path):
+    """Read `path` as if from storage serving `READ_RATE` bytes/s."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    time.sleep(len(data) / READ_RATE)
+    return data
+
+
+async def _load_many(paths, concurrency):
+    """Load `paths` with `PGalyzer.aload_many` over slow storage."""
+    async for _ in pgalyzer.PGalyzer.aload_many(
+            paths, clean_pg=True, n=[1, 2], concurrency=concurrency,
+            read=_slow_read):
+        pass
+
+
+def _time_api(case, path, repeat):
+    """
+    Time one API case on `path` in this process.
+
+    Every case is timed `repeat` times from scratch.  Methods are
+    called on a new analyzer of the cleaned file each time, so the
+    call includes building the indexes it needs; a second call on the
+    same analyzer is timed as `warm`.  Peak memory is also reported
+    before the case (`base_rss_mb`), which covers the imports.
+    """
+    base = _peak_rss()
+    runs = []
+    warm = []
+    if case in ('PGalyzer', 'PGalyzer-clean'):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            pgalyzer.PGalyzer(path, clean_pg=case == 'PGalyzer-clean')
+            runs.append(time.perf_counter() - start)
+    elif case == 'clean_pg_chunks':
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in pgalyzer.clean_pg_chunks(path):
+                pass
+            runs.append(time.perf_counter() - start)
+    elif case == 'from_corpus':
+        for _ in range(repeat):
+            start = time.perf_counter()
+            pgalyzer.PGalyzer.from_corpus([path, path], True, n=[1, 2],
+                                          workers=1)
+            runs.append(time.perf_counter() - start)
+    elif case == 'from_stream':
+        for _ in range(repeat):
+            start = time.perf_counter()
+            pgalyzer.PGalyzer.from_stream(path, True, n=[1, 2])
+            runs.append(time.perf_counter() - start)
+    elif case in ('export', 'from_export'):
+        # Memory-mapped exports of the unigrams, bigrams and bigram tables
+        with tempfile.TemporaryDirectory() as directory:
+            export = join(directory, 'counts')
+            for _ in range(repeat):
+                analyzer = pgalyzer.PGalyzer(path, clean_pg=True)
+                if case == 'export':
+                    for timings in (runs, warm):
+                        start = time.perf_counter()
+                        analyzer.export(export, n=[1, 2], bigrams=True,
+                                        format='npy')
+                        timings.append(time.perf_counter() - start)
+                    continue
+                analyzer.export(export, n=[1, 2], bigrams=True,
+                                format='npy')
+                start = time.perf_counter()
+                counts = pgalyzer.PGalyzer.from_export(export)
+                counts.ngrams(2, top=10)
+                counts.likely_next('the')
+                runs.append(time.perf_counter() - start)
+    elif case == 'append':
+        # Append chapters of 1% of the book to a fully indexed analyzer
+        for _ in range(repeat):
+            analyzer = pgalyzer.PGalyzer(path, clean_pg=True)
+            analyzer.ngrams([1, 2, 3])
+            analyzer.likely_next('the')
+            analyzer.concordance(WORD)
+            chapter = analyzer.text[:len(analyzer.text) // 100]
+            for timings in (runs, warm):
+                start = time.perf_counter()
+                analyzer.append(text=chapter)
+                timings.append(time.perf_counter() - start)
+    elif case.startswith('aload_many'):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            asyncio.run(_load_many([path] * LOAD_FILES,
+                                   int(case.rsplit('-', 1)[1])))
+            runs.append(time.perf_counter() - start)
+    else:
+        method, args, kwargs = API_CASES[case]
+        for _ in range(repeat):
+            analyzer = pgalyzer.PGalyzer(path, clean_pg=True)
+            for timings in (runs, warm):
+                start = time.perf_counter()
+                getattr(analyzer, method)(*args, **kwargs)
+                timings.append(time.perf_counter() - start)
+    return dict(runs=runs, warm=warm, base_rss_mb=base,
+                peak_rss_mb=_peak_rss())
+
+
+def _time_cli(case, path, repeat):
+    """
+    Time one CLI case on `path`, `repeat` times, each in a new process
+    whose output is discarded.  Memory is the peak of those processes.
+    """
+    command = [sys.executable, join(HERE, 'pgalyzer.py'),
+               CLI_CASES[case][0], path] + CLI_CASES[case][1:] + ['-c']
+    runs = []
+    peak = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        process = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+        _, status, usage = os.wait4(process.pid, 0)
+        runs.append(time.perf_counter() - start)
+        if status != 0:
+            raise click.ClickException('{} failed with status {}'.format(
+                ' '.join(command), status))
+        peak = max(peak, usage.ru_maxrss / (1 << 10))
+    return dict(runs=runs, warm=[], base_rss_mb=0, peak_rss_mb=peak)
+
+
+def _git_commit():
+    """Return the commit of the working tree, or None outside git."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=HERE,
+                                capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--',
+                                'pgalyzer.py'], cwd=HERE,
+                               capture_output=True, text=True).stdout
+        return commit + ('-dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+@click.group()
+def cli():
+    pass
+
+
+# generate block
+@cli.command('generate')
+@click.argument('path', type=click.Path(dir_okay=False))
+@click.option('-s', '--size', default='1M',
+              help='Approximate size, e.g. 100K, 10M or 1G.')
+@click.option('--seed', default=0, type=click.INT,
+              help='Seed of the random words.')
+@click.option('--crlf', is_flag=True, help='End lines with \\r\\n.')
+def generate_command(path, size, seed, crlf):
+    """
+    Write a synthetic Project Gutenberg file.
+
+    Parameters
+    ----------
+    path: str
+        Filepath to write
+    size: str
+        Approximate size, in bytes or with a K, M or G suffix
+    seed: int
+        Seed of the random words
+    crlf: bool
+        End lines with `\\r\\n`
+    """
+    generate(path, _parse_size(size), seed, crlf)
+
+
+# run block
+@cli.command()
+@click.option('-s', '--size', 'sizes', multiple=True, default=['1M'],
+              help='Size of a synthetic file to run on; repeatable.')
+@click.option('--seed', default=0, type=click.INT,
+              help='Seed of the synthetic files.')
+@click.option('-r', '--repeat', default=3, type=click.INT,
+              help='Number of timed runs of each case.')
+@click.option('-k', '--case', 'cases', multiple=True,
+              help='Run only this case; repeatable.')
+@click.option('-o', '--output', default='benchmark.json',
+              type=click.Path(dir_okay=False),
+              help='JSON file to write the results to.')
+@click.option('--data-dir', default=DATA_DIR,
+              type=click.Path(file_okay=False),
+              help='Directory of the synthetic files.')
+def run(sizes, seed, repeat, cases, output, data_dir):
+    """
+    Time every public method and CLI command on synthetic files.
+
+    Each case runs in a new process, so that its peak memory is its
+    own.  The results are written as JSON, along with the commit and
+    platform, for `compare`.
+
+    Parameters
+    ----------
+    sizes: tuple of str
+        Sizes of the synthetic files
+    seed: int
+        Seed of the synthetic files
+    repeat: int
+        Number of timed runs of each case
+    cases: tuple of str
+        Names of the cases to run (default: all)
+    output: str
+        JSON file to write the results to
+    data_dir: str
+        Directory of the synthetic files, generated on first use
+    """
+    names = list(cases) or list(API_CASES) + list(CLI_CASES)
+    unknown = set(names) - set(API_CASES) - set(CLI_CASES)
+    if unknown:
+        raise click.BadParameter('Unknown cases: {}'.format(
+            ', '.join(sorted(unknown))), param_hint='--case')
+
+    results = []
+    for size in map(_parse_size, sizes):
+        path = _data_file(data_dir, size, seed)
+        for name in names:
+            process = subprocess.run(
+                [sys.executable, abspath(__file__), 'case', name, path,
+                 '--repeat', str(repeat)],
+                capture_output=True, text=True)
+            if process.returncode != 0:
+                raise click.ClickException('Case {} failed:\n{}'.format(
+                    name, process.stderr))
+            result = json.loads(process.stdout)
+            result.update(case=name, size=size, seconds=float(
+                np.median(result['runs'])))
+            results.append(result)
+            click.echo('{:>12} {:<24} {:9.4f} s {:9.1f} MB'.format(
+                size, name, result['seconds'], result['peak_rss_mb']))
+
+    meta = dict(commit=_git_commit(),
+                date=datetime.now(timezone.utc).isoformat(),
+                python=platform.python_version(), numpy=np.__version__,
+                platform=platform.platform(), cpus=os.cpu_count(),
+                seed=seed, repeat=repeat)
+    with open(output, 'w') as f:
+        json.dump(dict(meta=meta, results=results), f, indent=1)
+
+
+# case block
+@cli.command(hidden=True)
+@click.argument('name')
+@click.argument('path')
+@click.option('--repeat', default=3, type=click.INT)
+def case(name, path, repeat):
+    """Run one case in this process and echo its result as JSON."""
+    if name in CLI_CASES:
+        result = _time_cli(name, path, repeat)
+    else:
+        result = _time_api(name, path, repeat)
+    click.echo(json.dumps(result))
+
+
+# compare block
+@cli.command()
+@click.argument('base', type=click.Path(exists=True, dir_okay=False))
+@click.argument('new', type=click.Path(exists=True, dir_okay=False))
+@click.option('-t', '--threshold', default=0.1, type=click.FLOAT,
+              help='Relative slowdown or growth counted as a regression.')
+def compare(base, new, threshold):
+    """
+    Compare two result files of `run` and exit with status 1 if any
+    case got slower or used more memory by more than `threshold`.
+
+    Parameters
+    ----------
+    base: str
+        Results of the reference commit
+    new: str
+        Results to check
+    threshold: float
+        Relative change counted as a regression (default: 0.1)
+
+    Echoes
+    ----
+    table: str
+        Time and peak memory of each case in both files, with their
+        ratio, and `REGRESSION` next to the cases that got worse
+    """
+    with open(base) as f:
+        base = json.load(f)
+    with open(new) as f:
+        new = json.load(f)
+    before = {(r['size'], r['case']): r for r in base['results']}
+
+    regressions = 0
+    click.echo('{} -> {}'.format(base['meta']['commit'],
+                                 new['meta']['commit']))
+    for result in new['results']:
+        old = before.get((result['size'], result['case']))
+        if old is None:
+            continue
+        time_ratio = result['seconds'] / max(old['seconds'], 1e-9)
+        memory_ratio = result['peak_rss_mb'] / max(old['peak_rss_mb'], 1e-9)
+        worse = time_ratio > 1 + threshold or memory_ratio > 1 + threshold
+        regressions += worse
+        click.echo('{:>12} {:<24} {:9.4f} -> {:9.4f} s ({:5.2f}x) '
+                   '{:8.1f} -> {:8.1f} MB ({:5.2f}x){}'.format(
+                       result['size'], result['case'], old['seconds'],
+                       result['seconds'], time_ratio, old['peak_rss_mb'],
+                       result['peak_rss_mb'], memory_ratio,
+                       '  REGRESSION' if worse else ''))
+    if regressions:
+        raise click.ClickException('{} regressions'.format(regressions))
+
+
+if __name__ == '__main__':
+    cli()
@@ -6,128 +6,3192 @@ import numpy as np
 import click
 
 # STANDARD PYTHON
-from collections import Counter, defaultdict
-from os.path import exists
+import asyncio
+import builtins
+import hashlib
+import heapq
+import io
+import json
+import os
+import re
+import shutil
+import socket
+import tempfile
+import time
+import tracemalloc
+from array import array
+from bisect import bisect_left
+from collections import Counter, OrderedDict, deque
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+from glob import escape as glob_escape, glob
+from itertools import chain, islice
+from multiprocessing.shared_memory import SharedMemory
+from os.path import exists, expanduser, isdir, isfile, join
 from sys import stdin
 
+# Project Gutenberg cleaning
+PG_HEAD = '*** start of this project gutenberg ebook'
+PG_FOOT = '*** end of this project gutenberg ebook'
+PUNCTUATION = '|;,.:?!"()[]{}/\\-+'
+CHUNK_SIZE = 1 << 20
+
+# On-disk analysis cache
+CACHE_DIR = join(expanduser('~'), '.cache', 'pgalyzer')
+CACHE_SIZE = 1 << 30
+CACHE_VERSION = 1
+
+# Approximate n-gram counting
+MEMORY_BUDGET = 64 << 20
+SKETCH_DEPTH = 4
+
+# Columnar export of counts
+EXPORT_FORMATS = ('npz', 'npy')
+EXPORT_VERSION = 1
+
+# Counting a single text in several processes
+SHARD_SIZE = 1 << 23
+
+# Sorting the CLI output in sorted runs on disk, merged at most
+# MERGE_FAN_IN at a time
+SORT_BUDGET = 256 << 20
+MERGE_FAN_IN = 64
+
+# Files read at the same time by `PGalyzer.aload_many`
+LOAD_CONCURRENCY = 4
+
+# Longest n-grams of the prediction trie
+TRIE_ORDER = 4
+
+# Collocation measures of windowed co-occurrences
+COLLOCATION_MEASURES = ('pmi', 'log_likelihood', 't_score')
+
+
+class Stats:
+    """
+    Named timers and counters of the stages of an analysis.
+
+    Every PGalyzer object has one as its `stats` attribute.  It records
+    nothing unless `enabled`, and then costs a few microseconds per
+    stage call.  Times are exclusive: a stage that runs inside another,
+    such as reading the file while cleaning pulls blocks from it,
+    is not counted in the outer stage.  With `memory`, the peak of the
+    memory allocated during each stage is also traced, which slows
+    down the analysis.
+
+    Parameters
+    ----------
+    enabled: boolean
+        Record the stages
+    memory: boolean
+        Also record the peak allocation of each stage with
+        `tracemalloc`; implies `enabled`
+
+    Examples
+    --------
+    >>> analyzer = PGalyzer('1342.txt', clean_pg=True, profile=True)
+    >>> analyzer.ngrams(2, top=10)
+    >>> print(analyzer.stats.report())
+    stage            calls   seconds        chars       tokens   peak MB
+    read                 1    0.0013       772420            0         -
+    clean                1    0.0078            0            0         -
+    ...
+    """
+    def __init__(self, enabled=False, memory=False):
+        self.enabled = enabled or memory
+        self.memory = memory
+        self.stages = {}
+        self._stack = []
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def _stage(self, name):
+        if name not in self.stages:
+            self.stages[name] = dict(calls=0, seconds=0.0, chars=0,
+                                     tokens=0, peak_bytes=0)
+        return self.stages[name]
+
+    def add(self, name, **counts):
+        """Add to the `chars` and `tokens` counters of stage `name`."""
+        if self.enabled:
+            stage = self._stage(name)
+            for key, value in counts.items():
+                stage[key] += value
+
+    def stage(self, name):
+        """Return a context manager that times a call of stage `name`."""
+        if not self.enabled:
+            return nullcontext()
+        return self._timed(name)
+
+    @contextmanager
+    def _timed(self, name):
+        frame = self._enter()
+        try:
+            yield
+        finally:
+            self._exit(name, frame)
+
+    def _enter(self):
+        # Each frame is [start, time of inner stages, base, peak]
+        if self.memory:
+            if self._stack:
+                parent = self._stack[-1]
+                parent[3] = max(parent[3], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        else:
+            base = 0
+        frame = [time.perf_counter(), 0.0, base, 0]
+        self._stack.append(frame)
+        return frame
+
+    def _exit(self, name, frame):
+        elapsed = time.perf_counter() - frame[0]
+        self._stack.pop()
+        stage = self._stage(name)
+        stage['calls'] += 1
+        stage['seconds'] += elapsed - frame[1]
+        if self._stack:
+            self._stack[-1][1] += elapsed
+        if self.memory:
+            peak = max(frame[3], tracemalloc.get_traced_memory()[1])
+            stage['peak_bytes'] = max(stage['peak_bytes'], peak - frame[2])
+            if self._stack:
+                self._stack[-1][3] = max(self._stack[-1][3], peak)
+
+    def iterate(self, name, items, chars=False):
+        """
+        Time the production of each item of `items` as stage `name`,
+        counting the characters of the items if `chars`.  Returns
+        `items` itself when disabled.
+        """
+        if not self.enabled:
+            return items
+        return self._iterate(name, iter(items), chars)
+
+    def _iterate(self, name, items, chars):
+        # Called once per paragraph, so without a context manager
+        while True:
+            frame = self._enter()
+            try:
+                item = next(items)
+            except StopIteration:
+                return
+            finally:
+                self._exit(name, frame)
+            if chars:
+                self.stages[name]['chars'] += len(item)
+            yield item
+
+    def as_dict(self):
+        """Return the counters of each stage, in order of first use."""
+        return {name: dict(stage) for name, stage in self.stages.items()}
+
+    def report(self):
+        """Return the counters as a table, one stage per line."""
+        lines = ['{:<16}{:>6}{:>10}{:>13}{:>13}{:>10}'.format(
+            'stage', 'calls', 'seconds', 'chars', 'tokens', 'peak MB')]
+        for name, stage in self.stages.items():
+            peak = ('{:10.1f}'.format(stage['peak_bytes'] / (1 << 20))
+                    if self.memory else '{:>10}'.format('-'))
+            lines.append('{:<16}{:>6}{:>10.4f}{:>13}{:>13}{}'.format(
+                name, stage['calls'], stage['seconds'], stage['chars'],
+                stage['tokens'], peak))
+        total = sum(stage['seconds'] for stage in self.stages.values())
+        lines.append('{:<16}{:>6}{:>10.4f}'.format('total', '', total))
+        return '\n'.join(lines)
+
+
+def _read_chunks(text_file, size=CHUNK_SIZE):
+    """
+    Yield the contents of `text_file` in chunks of `size` characters.
+
+    `text_file` is either a filepath or a `(first_line, stream)` tuple
+    as built by the CLI for standard input.
+    """
+    if isinstance(text_file, str):
+        with open(text_file, 'r') as f:
+            for chunk in iter(lambda: f.read(size), ''):
+                yield chunk
+    else:
+        yield text_file[0]
+        for chunk in iter(lambda: text_file[1].read(size), ''):
+            yield chunk.replace('\r', ' ')
+
+
+def _text_blocks(chunks, size=CHUNK_SIZE):
+    """
+    Regroup a stream of text chunks into blocks of at least `size`
+    characters, except the last one.
+
+    Each block but the first starts with a run of newlines that is
+    never split, so cleaning the blocks one at a time gives the same
+    paragraphs as cleaning the whole text.
+    """
+    rest = []
+    length = 0
+    for chunk in chunks:
+        rest.append(chunk)
+        length += len(chunk)
+        if length < size or '\n' not in chunk:
+            continue
+        text = ''.join(rest)
+        cut = text.rfind('\n')
+        while cut > 0 and text[cut - 1] == '\n':
+            cut -= 1
+        if cut <= 0:
+            rest = [text]
+            continue
+        yield text[:cut]
+        rest = [text[cut:]]
+        length = len(rest[0])
+    yield ''.join(rest)
+
+
+def _clean_block(job):
+    """Clean one block of text, for a pool of processes."""
+    engine, block, first = job
+    return engine.clean_block(block, first)
+
+
+class CleaningEngine:
+    """
+    Cleaning of Project Gutenberg texts, compiled once and run on
+    large blocks of text rather than one paragraph at a time.
+
+    The steps run in this order, each one optional:
+
+    - 'lowercase': make all letters lowercase
+    - 'strip_markers': drop everything up to and including the first
+      paragraph starting with `head`, and everything from the last
+      paragraph starting with `foot`
+    - 'join_lines': join the lines of each paragraph with spaces, and
+      separate paragraphs with a single newline
+    - 'drop_punctuation': remove the characters of `punctuation`
+
+    and the result is stripped of whitespace at both ends.  Paragraphs
+    are separated by blank lines, as in `text.split('\\n\\n')`, and
+    markers are matched against the text as left by the earlier steps.
+
+    Each block is lowercased once, searched for markers, and encoded
+    as UTF-8 so that the other steps are a regular expression and a
+    `bytes.translate` over the whole block.  With all the steps, the
+    result is the `text` attribute of `PGalyzer(..., clean_pg=True)`.
+
+    Parameters
+    ----------
+    steps: iterable of str
+        Steps to run, among `CleaningEngine.STEPS`
+    punctuation: str
+        ASCII characters removed by 'drop_punctuation'
+    head, foot: str
+        Start of the header and footer marker paragraphs
+
+    Examples
+    --------
+    >>> engine = CleaningEngine(steps=['lowercase', 'drop_punctuation'])
+    >>> ''.join(engine.clean(['Hello, World!\\n\\nBye.']))
+    'hello world\\n\\nbye'
+    """
+    STEPS = ('lowercase', 'strip_markers', 'join_lines', 'drop_punctuation')
+
+    def __init__(self, steps=STEPS, punctuation=PUNCTUATION, head=PG_HEAD,
+                 foot=PG_FOOT):
+        steps = set(steps)
+        if not steps <= set(self.STEPS):
+            raise ValueError('Unknown cleaning steps: {}.'.format(
+                ', '.join(sorted(steps - set(self.STEPS)))))
+        if not punctuation.isascii():
+            raise ValueError('Only ASCII punctuation can be removed.')
+        self.steps = tuple(step for step in self.STEPS if step in steps)
+        self.punctuation = punctuation
+        self.head = head
+        self.foot = foot
+
+        # Runs of blank lines become 0xFF, a byte that is never part of
+        # UTF-8, and then newlines; the other newlines become spaces
+        self._runs = re.compile(b'\n\n+')
+        self._table = bytes.maketrans(b'\n\xff', b' \n')
+        self._delete = (punctuation.encode('ascii')
+                        if 'drop_punctuation' in steps else b'')
+        self._markers = re.compile(b'|'.join(
+            re.escape(m.encode('utf-8')) for m in (head, foot)))
+
+    def clean_block(self, block, first=False):
+        """
+        Clean one block of text, as cut by `_text_blocks`; `first` is
+        True for the block at the start of the text.
+
+        Returns a list of `(marker, text)` pieces.  `marker` is 'head'
+        or 'foot' for a piece that starts with a marker paragraph,
+        'para' for a piece that starts right after the first blank
+        lines of the block or of a header paragraph, and None for the
+        first piece.
+        """
+        if 'lowercase' not in self.steps:
+            data = block.encode('utf-8')
+        elif block.isascii():
+            data = block.encode('ascii').lower()
+        else:
+            data = block.lower().encode('utf-8')
+
+        # Places where the marker steps may need to cut the text
+        cuts = {}
+        if 'strip_markers' in self.steps:
+            run = self._runs.search(data)
+            if run is not None:
+                cuts[run.end()] = 'para'
+            head = self.head.encode('utf-8')
+            for match in self._markers.finditer(data):
+                start = match.start()
+                if not self._starts_paragraph(data, start, first):
+                    continue
+                if match.group() == head:
+                    cuts[start] = 'head'
+                    run = self._runs.search(data, start)
+                    if run is not None:
+                        cuts.setdefault(run.end(), 'para')
+                else:
+                    cuts[start] = 'foot'
+
+        pieces = []
+        starts = sorted(cuts.keys() | {0})
+        for start, end in zip(starts, starts[1:] + [len(data)]):
+            piece = data[start:end]
+            if 'join_lines' in self.steps:
+                piece = self._runs.sub(b'\xff', piece).translate(
+                    self._table, self._delete)
+            elif self._delete:
+                piece = piece.translate(None, self._delete)
+            pieces.append((cuts.get(start), piece.decode('utf-8')))
+        return pieces
+
+    @staticmethod
+    def _starts_paragraph(data, start, first):
+        """
+        Whether `start` is the start of a paragraph of `data`: the start
+        of the text, or after an even number of newlines, since
+        `split('\\n\\n')` leaves the last newline of an odd run at the
+        start of the next paragraph.
+        """
+        end = start
+        while start > 0 and data[start - 1] == ord('\n'):
+            start -= 1
+        if start == end:
+            return first and start == 0
+        return (end - start) % 2 == 0
+
+    def _strip_markers(self, pieces):
+        """
+        Drop the header and footer from a stream of `(marker, text)`
+        pieces, yielding the text that is kept.
+
+        Pieces are held back only while they may still turn out to be
+        header (until a header is seen) or footer (after a footer
+        marker), so memory use does not grow with the body.
+        """
+        # Before the header: hold everything in case a header shows up
+        held = []
+        for marker, text in pieces:
+            if marker == 'head':
+                held = []
+                # Drop the rest of the header paragraph
+                for marker, text in pieces:
+                    if marker is not None:
+                        pieces = chain([(marker, text)], pieces)
+                        break
+                break
+            held.append((marker, text))
+        else:
+            # No header: nothing is dropped from the top
+            pieces = iter(held)
+            held = []
+
+        # After the header: hold everything from the latest footer marker
+        for marker, text in pieces:
+            if marker == 'foot':
+                yield from held
+                held = [text]
+            elif held:
+                held.append(text)
+            else:
+                yield text
+
+    @staticmethod
+    def _strip_whitespace(texts):
+        """
+        Strip whitespace from both ends of the concatenation of `texts`,
+        yielding pieces of the result.
+        """
+        started = False
+        pending = ''
+        for text in texts:
+            if not started:
+                text = text.lstrip()
+                if not text:
+                    continue
+                started = True
+            body = text.rstrip()
+            if body:
+                yield pending + body
+                pending = text[len(body):]
+            else:
+                pending += text
+
+    def clean(self, chunks, stats=None, workers=1, block_size=CHUNK_SIZE):
+        """
+        Clean a stream of text chunks.
+
+        Parameters
+        ----------
+        chunks: iterable of str
+            The text, in pieces of any size
+        stats: Stats
+            If given, records the `clean` (per block) and `strip`
+            (markers and whitespace) stages
+        workers: int
+            Number of processes cleaning blocks at the same time; with
+            1, blocks are cleaned in this process
+        block_size: int
+            Number of characters cleaned at a time
+
+        Returns
+        -------
+        : generator of str
+            Pieces of the cleaned text
+        """
+        stats = stats or Stats()
+        blocks = _text_blocks(chunks, block_size)
+        jobs = ((self, block, i == 0) for i, block in enumerate(blocks))
+        if workers == 1:
+            cleaned = map(_clean_block, jobs)
+        else:
+            cleaned = self._clean_parallel(jobs, workers)
+        cleaned = stats.iterate('clean', cleaned)
+        pieces = (piece for block in cleaned for piece in block)
+        if 'strip_markers' in self.steps:
+            texts = self._strip_markers(pieces)
+        else:
+            texts = (text for _, text in pieces)
+        return stats.iterate('strip', self._strip_whitespace(texts),
+                             chars=True)
+
+    @staticmethod
+    def _clean_parallel(jobs, workers):
+        """
+        Clean blocks in a pool of processes, in order, with at most
+        two blocks per process read ahead.
+        """
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            window = 2 * (workers or os.cpu_count())
+            pending = deque(pool.submit(_clean_block, job)
+                            for job in islice(jobs, window))
+            while pending:
+                pieces = pending.popleft().result()
+                for job in islice(jobs, 1):
+                    pending.append(pool.submit(_clean_block, job))
+                yield pieces
+
+
+# Default cleaning, behind `clean_pg=True`
+PG_CLEANING = CleaningEngine()
+
+
+def clean_pg_chunks(text_file, stats=None, workers=1):
+    """
+    Stream the cleaned contents of a Project Gutenberg file.
+
+    This is the cleaning pipeline behind `PGalyzer(..., clean_pg=True)`.
+    The file is read and cleaned a block at a time by `PG_CLEANING`, so
+    memory use stays roughly constant however large the file is.
+
+    Parameters
+    ----------
+    text_file: string or tuple
+        Filepath of a Project Gutenberg file, or `(first_line, stream)`
+        for standard input
+    stats: Stats
+        If given, records the `read`, `clean` and `strip` stages of the
+        pipeline
+    workers: int
+        Number of processes cleaning blocks at the same time
+
+    Returns
+    -------
+    : generator of str
+        Pieces of cleaned text; joined, they are equal to the `text`
+        attribute of `PGalyzer(text_file, clean_pg=True)`
+    """
+    stats = stats or Stats()
+    chunks = stats.iterate('read', _read_chunks(text_file), chars=True)
+    return PG_CLEANING.clean(chunks, stats, workers)
+
+
+def _line_batches(chunks, size=CHUNK_SIZE):
+    """
+    Regroup a stream of text chunks into batches of whole lines.
+
+    Each batch holds at least `size` characters, except the last one,
+    and is cut at a newline that is left out, so that joining the
+    batches with `'\\n'` gives `''.join(chunks)`.
+    """
+    rest = []
+    length = 0
+    for chunk in chunks:
+        length += len(chunk)
+        cut = chunk.rfind('\n') if length >= size else -1
+        if cut < 0:
+            rest.append(chunk)
+            continue
+        rest.append(chunk[:cut])
+        yield ''.join(rest)
+        rest = [chunk[cut + 1:]]
+        length = len(rest[0])
+    yield ''.join(rest)
+
+
+class _AnalysisCache:
+    """
+    On-disk cache of the analysis of one file.
+
+    Entries are directories of `directory` named after a hash of the
+    file contents and the `clean_pg` flag, so an entry is never reused
+    once the file changes.  An entry holds the loaded text and the
+    vocabulary as text files, and NumPy arrays as `.npy` files that
+    are loaded memory-mapped.  When all entries together take more
+    than `max_bytes`, the least recently used ones are deleted.
+    """
+    def __init__(self, directory, text_file, clean_pg, max_bytes=CACHE_SIZE):
+        digest = hashlib.blake2b(digest_size=16)
+        with open(text_file, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.path = join(directory, '{}-{}-v{}'.format(
+            digest.hexdigest(), 'clean' if clean_pg else 'raw',
+            CACHE_VERSION))
+        self.text = None
+
+    def _write(self, name, write):
+        """Write file `name` of the entry atomically with `write(f)`."""
+        os.makedirs(self.path, exist_ok=True)
+        temp = join(self.path, '{}.{}.tmp'.format(name, os.getpid()))
+        with open(temp, 'wb') as f:
+            write(f)
+        os.replace(temp, join(self.path, name))
+
+    def load_text(self, name):
+        """Return the text saved under `name`, or None."""
+        try:
+            with open(join(self.path, name + '.txt'), 'r',
+                      encoding='utf-8', newline='') as f:
+                text = f.read()
+        except FileNotFoundError:
+            return None
+        os.utime(self.path)
+        return text
+
+    def save_text(self, name, text):
+        """Save `text` under `name`."""
+        self._write(name + '.txt', lambda f: f.write(text.encode('utf-8')))
+        self.evict()
+
+    def load(self, name):
+        """Return the arrays saved under `name` as a dict, or None."""
+        try:
+            with open(join(self.path, name + '.fields'), 'r') as f:
+                fields = f.read().split()
+            arrays = {field: np.load(join(self.path, '{}.{}.npy'.format(
+                          name, field)), mmap_mode='r')
+                      for field in fields}
+        except FileNotFoundError:
+            return None
+        os.utime(self.path)
+        return arrays
+
+    def save(self, name, **arrays):
+        """Save numpy `arrays` under `name`."""
+        for field, arr in arrays.items():
+            self._write('{}.{}.npy'.format(name, field),
+                        lambda f: np.save(f, arr))
+        # The list of fields is written last and marks the save complete
+        self._write(name + '.fields',
+                    lambda f: f.write(' '.join(arrays).encode()))
+        self.evict()
+
+    def evict(self):
+        """Delete least recently used entries until under `max_bytes`."""
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.is_dir():
+                    size = sum(f.stat().st_size for f in os.scandir(entry))
+                    entries.append((entry.stat().st_mtime, size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path != self.path:
+                shutil.rmtree(path, ignore_errors=True)
+                total -= size
+
+
+def _string_table(words):
+    """
+    Pack `words` into a UTF-8 byte array, each word followed by a
+    newline, and the byte offset where each word starts followed by
+    the total length.
+    """
+    data = np.frombuffer(''.join(w + '\n' for w in words).encode('utf-8'),
+                         dtype=np.uint8)
+    lengths = np.fromiter((len(w.encode('utf-8')) + 1 for w in words),
+                          dtype=np.int64, count=len(words))
+    return data, np.concatenate([[0], np.cumsum(lengths)])
+
+
+def _count_file(job):
+    """
+    Count the n-grams of one file for `PGalyzer.from_corpus`.
+
+    `job` is a `(path, clean_pg, sizes, cache_dir, cache_size)` tuple.
+    Returns the words of the file and its `_count_ngrams` table, both
+    in terms of the file's own word IDs.
+    """
+    path, clean_pg, sizes, cache_dir, cache_size = job
+    analyzer = PGalyzer(path, clean_pg, cache_dir, cache_size)
+    table = analyzer._count_ngrams(sizes)
+    return analyzer._words, table
+
+
+def _sketch_file(job):
+    """
+    Sketch the n-grams of one file for `PGalyzer.from_corpus` with
+    `approx=True`.
+
+    `job` is a `(path, clean_pg, sizes, cache_dir, cache_size,
+    memory_budget)` tuple.  Returns a dict of `_NgramSketch` by size.
+    """
+    path, clean_pg, sizes, cache_dir, cache_size, memory_budget = job
+    analyzer = PGalyzer(path, clean_pg, cache_dir, cache_size)
+    return {k: analyzer._sketch(k, memory_budget) for k in sizes}
+
+
+def _read_bytes(path):
+    """Return the contents of the file at `path` as bytes."""
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def _load_contents(job):
+    """
+    Build the PGalyzer object of one file of `PGalyzer.aload_many`
+    from its contents, and count its n-grams.
+
+    `job` is a `(data, clean_pg, sizes)` tuple, where `data` holds the
+    bytes of the file.  They are decoded as `open(path, 'r')` would,
+    so the text is the same as that of `PGalyzer(path, clean_pg)`.
+    """
+    data, clean_pg, sizes = job
+    stream = io.TextIOWrapper(io.BytesIO(data))
+    analyzer = PGalyzer(('', stream), clean_pg)
+    if sizes:
+        analyzer._count_ngrams(sizes)
+    return analyzer
+
+
+def _tokenize_text(text, block_size=CHUNK_SIZE):
+    """
+    Split `text` into paragraphs and words, as `PGalyzer._tokenize`
+    does, and return its `(vocab, tokens, offsets)`.
+
+    The text is split about `block_size` characters of paragraphs at
+    a time, and the words of a block are replaced by their IDs before
+    the next one is split.  Only the distinct words are kept as
+    strings, and each token takes 4 bytes.
+    """
+    vocab = {}
+    tokens = array('i')
+    lengths = array('q', [0])
+    start = 0
+    while start <= len(text):
+        end = text.find('\n', start + block_size)
+        if end < 0:
+            end = len(text)
+
+        # Split into paragraphs and words in a single pass
+        words = []
+        for line in text[start:end].split('\n'):
+            items = line.split()
+            words.extend(items)
+            lengths.append(len(items))
+
+        # Assign IDs to new words in order of first appearance
+        for word in dict.fromkeys(words):
+            if word not in vocab:
+                vocab[word] = len(vocab)
+        tokens.extend(map(vocab.__getitem__, words))
+        start = end + 1
+    return (vocab, np.frombuffer(tokens, dtype=np.int32),
+            np.cumsum(lengths, dtype=np.int64))
+
+
+def _count_windows(tokens, room, size, sizes, part=0, parts=1):
+    """
+    Count the n-grams of the sizes in `sizes`, all above 1, in
+    `tokens`, as `PGalyzer._count_ngrams` does.
+
+    `room` is the number of tokens from each token to the end of its
+    paragraph, and `size` the number of distinct word IDs.  With
+    `parts` above 1, only the n-grams of one `part` are counted: the
+    parts split the n-grams by a hash of their first two words, so
+    they never share an n-gram.
+
+    Returns a dict mapping each size to `(ids, counts, positions)`, in
+    order of first appearance, where `positions` holds the index in
+    `tokens` where each n-gram first starts.
+    """
+    table = {}
+
+    # Starts of the windows that fit in their paragraph
+    starts = np.flatnonzero(room >= 2)
+    if parts > 1:
+        pairs = (tokens[starts].astype(np.uint64) * np.uint64(size)
+                 + tokens[starts + 1].astype(np.uint64))
+        starts = starts[_mix(pairs) % np.uint64(parts) == part]
+    codes = tokens[starts].astype(np.int64)
+    bound = size
+
+    for k in range(2, max(sizes, default=1) + 1):
+        keep = room[starts] >= k
+        starts, codes = starts[keep], codes[keep]
+
+        # Extend each (k-1)-gram code with the next word ID
+        if bound * size > np.iinfo(np.int64).max:
+            _, codes = np.unique(codes, return_inverse=True)
+            bound = int(codes.max(initial=0)) + 1
+        codes = codes * size + tokens[starts + k - 1]
+        bound *= size
+
+        if k in sizes:
+            uniq, first, codes, counts = np.unique(
+                codes, return_index=True, return_inverse=True,
+                return_counts=True)
+            bound = len(uniq)
+            order = np.argsort(first)
+            positions = starts[first[order]]
+            ids = tokens[positions[:, None] + np.arange(k)]
+            table[k] = (ids, counts[order], positions)
+    return table
+
+
+@contextmanager
+def _shared_buffers(buffers):
+    """
+    Copy each of `buffers`, bytes or contiguous arrays, to a block of
+    shared memory, and yield the `(name, nbytes)` of every block.  The
+    blocks are freed on exit.
+    """
+    blocks = []
+    try:
+        for buffer in buffers:
+            buffer = memoryview(buffer).cast('B')
+            block = SharedMemory(create=True, size=max(buffer.nbytes, 1))
+            blocks.append((block, buffer.nbytes))
+            block.buf[:buffer.nbytes] = buffer
+        yield [(block.name, nbytes) for block, nbytes in blocks]
+    finally:
+        for block, _ in blocks:
+            block.close()
+            block.unlink()
+
+
+def _tokenize_shard(job):
+    """
+    Tokenize one shard of a text for `PGalyzer._tokenize`.
+
+    `job` is the `(name, nbytes)` of the block of shared memory holding
+    the shard in UTF-8.  Returns its words, tokens and offsets, in
+    terms of the shard's own word IDs.
+    """
+    name, nbytes = job
+    block = SharedMemory(name)
+    try:
+        text = str(block.buf[:nbytes], 'utf-8')
+    finally:
+        block.close()
+    vocab, tokens, offsets = _tokenize_text(text)
+    return list(vocab), tokens, offsets
+
+
+def _count_shard(job):
+    """
+    Count one part of the n-grams of a text for
+    `PGalyzer._count_ngrams`.
+
+    `job` is a `(tokens, room, length, part, parts, size, sizes)`
+    tuple, where `tokens` and `room` are the `(name, nbytes)` of the
+    blocks of shared memory holding the int32 tokens and int64 room of
+    `_count_windows`, both of `length` elements.  Returns its counts,
+    in terms of the text's word IDs.
+    """
+    (tokens_name, _), (room_name, _), length, part, parts, size, sizes = job
+    tokens_block = SharedMemory(tokens_name)
+    room_block = SharedMemory(room_name)
+    try:
+        tokens = np.frombuffer(tokens_block.buf, dtype=np.int32,
+                               count=length)
+        room = np.frombuffer(room_block.buf, dtype=np.int64, count=length)
+        table = _count_windows(tokens, room, size, sizes, part, parts)
+        del tokens, room
+    finally:
+        tokens_block.close()
+        room_block.close()
+    return table
+
+
+def _run_key(line):
+    """
+    Return the merge key of a line of a sorted run of
+    `PGalyzer._external_rank`, followed by its n-gram and count.
+    """
+    count, index, ngram = line.rstrip('\n').split('\t', 2)
+    count = int(count)
+    return -count, ngram.lower(), int(index), ngram, count
+
+
+def _write_run(lines):
+    """
+    Write `lines` to a new temporary run file and return it rewound
+    for reading.
+    """
+    run = tempfile.TemporaryFile('w+', encoding='utf-8')
+    try:
+        run.writelines(lines)
+        run.seek(0)
+    except BaseException:
+        run.close()
+        raise
+    return run
+
+
+def _merge_group(runs):
+    """
+    Merge sorted runs into a single new run.  The runs are closed, and
+    so deleted, once it is written.
+    """
+    try:
+        return _write_run(heapq.merge(*runs, key=_run_key))
+    finally:
+        for run in runs:
+            run.close()
+
+
+def _merge_runs(runs):
+    """
+    Merge the sorted runs of `PGalyzer._external_rank`, at most
+    `MERGE_FAN_IN` of them, and yield their `(ngram, count)` tuples in
+    output order.  The run files are closed, and so deleted, once the
+    merge is done.
+    """
+    try:
+        for line in heapq.merge(*runs, key=_run_key):
+            count, _, ngram = line.rstrip('\n').split('\t', 2)
+            yield ngram, int(count)
+    finally:
+        for run in runs:
+            run.close()
+
+
+def _ngram_sizes(n):
+    """
+    Return the list of n-gram sizes given as `n`, an int or a list of
+    ints, and raise ValueError if one is below 1.
+    """
+    sizes = [n] if np.isscalar(n) else list(n)
+    if any(k < 1 for k in sizes):
+        raise ValueError('n-gram sizes must be at least 1.')
+    return sizes
+
+
+def _sum_rows(ids, counts, size):
+    """
+    Add up the counts of identical rows of word IDs.
+
+    Rows are returned in order of first appearance, as `(ids, counts)`.
+    `size` is the number of distinct word IDs.
+    """
+    # Pack each row into one int64 code, renumbering if it would overflow
+    codes = np.zeros(len(ids), dtype=np.int64)
+    bound = 1
+    for column in ids.T:
+        if bound * size > np.iinfo(np.int64).max:
+            _, codes = np.unique(codes, return_inverse=True)
+            bound = int(codes.max(initial=0)) + 1
+        codes = codes * size + column
+        bound *= size
+
+    _, first, inverse = np.unique(codes, return_index=True,
+                                  return_inverse=True)
+    totals = np.bincount(inverse, weights=counts,
+                         minlength=len(first)).astype(np.int64)
+    order = np.argsort(first)
+    return ids[first[order]], totals[order]
+
+
+def _csr_update(indptr, columns, size, keys, values, replace=False):
+    """
+    Add entries to an index stored as `indptr` and `columns`, where the
+    entries of group `g` are `column[indptr[g]:indptr[g+1]]` for each
+    array in `columns`.
+
+    The new entries belong to the groups in `keys`, which is sorted,
+    and hold the matching items of `values`.  They are placed after the
+    existing entries of their group, or instead of them if `replace`
+    is True.  The result has `size` groups; existing entries are moved
+    with array operations, without sorting.
+
+    Returns the new `(indptr, columns)`.
+    """
+    lengths = np.diff(indptr)
+    group = np.repeat(np.arange(len(lengths)), lengths)
+    kept = np.zeros(size, dtype=np.int64)
+    kept[:len(lengths)] = lengths
+    if replace:
+        kept[keys] = 0
+    mask = kept[group] > 0
+
+    new_indptr = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(kept + np.bincount(keys, minlength=size), out=new_indptr[1:])
+    index = np.flatnonzero(mask)
+    old = new_indptr[group[index]] + index - indptr[group[index]]
+    new = (new_indptr[keys] + kept[keys] + np.arange(len(keys))
+           - np.searchsorted(keys, keys))
+
+    updated = []
+    for column, value in zip(columns, values):
+        array = np.empty(new_indptr[-1], dtype=column.dtype)
+        array[old] = column[index]
+        array[new] = value
+        updated.append(array)
+    return new_indptr, updated
+
+
+def _mix(x):
+    """Scramble an array of uint64 hashes (the splitmix64 finalizer)."""
+    x = x ^ (x >> np.uint64(30))
+    x = x * np.uint64(0xbf58476d1ce4e5b9)
+    x = x ^ (x >> np.uint64(27))
+    x = x * np.uint64(0x94d049bb133111eb)
+    return x ^ (x >> np.uint64(31))
+
+
+def _word_hashes(words):
+    """
+    Return a uint64 hash of each word that is the same in every process,
+    unlike `hash`, so that sketches of different files can be merged.
+    """
+    return np.fromiter((int.from_bytes(hashlib.blake2b(
+                            w.encode(), digest_size=8).digest(), 'little')
+                        for w in words),
+                       dtype=np.uint64, count=len(words))
+
+
+class _NgramSketch:
+    """
+    Approximate n-gram counts in a fixed amount of memory.
+
+    A Count-Min sketch of `depth` rows estimates the count of any
+    n-gram, and a Misra-Gries summary keeps the (at most `capacity`)
+    n-grams that may be frequent, along with their strings.  Half of
+    `memory_budget` goes to the sketch, a quarter to the summary and a
+    quarter to the windows counted at a time.  N-grams are identified
+    by a 64-bit hash of their words, so sketches of the same `n` and
+    budget can be merged across files.
+
+    With `N` the number of n-grams counted, the estimate `c` of an
+    n-gram with true count `t` satisfies `t <= c <= t + error`, where
+    `error` is the smaller of the summary's `decrement` (at most
+    `N / (capacity + 1)`) and, with probability `1 - exp(-depth)`,
+    `e * N / width`.  Every n-gram with `t > decrement` is kept.
+    """
+    def __init__(self, n, memory_budget=MEMORY_BUDGET, depth=SKETCH_DEPTH):
+        self.n = n
+        self.memory_budget = memory_budget
+        self.width = max(memory_budget // 2 // (8 * depth), 1)
+        self.capacity = max(memory_budget // 4 // 256, 1)
+        self.chunk = max(memory_budget // 4 // 96, 1)
+        self.seeds = _mix(np.arange(1, depth + 1, dtype=np.uint64))
+        self.table = np.zeros((depth, self.width), dtype=np.int64)
+        self.keys = np.zeros(0, dtype=np.uint64)
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.names = {}
+        self.total = 0
+        self.decrement = 0
+
+    def _columns(self, keys):
+        """Yield the column of `keys` in each row of the sketch."""
+        for seed in self.seeds:
+            yield (_mix(keys ^ seed) % np.uint64(self.width)).astype(np.intp)
+
+    def _add(self, keys, counts, render):
+        """
+        Merge counted `keys` into the summary, then drop all but the
+        `capacity` largest counts, Misra-Gries style.  `render` returns
+        the strings of an array of the new keys that are kept.
+        """
+        keys = np.concatenate([self.keys, keys])
+        counts = np.concatenate([self.counts, counts])
+        keys, inverse = np.unique(keys, return_inverse=True)
+        counts = np.bincount(inverse, weights=counts).astype(np.int64)
+
+        if len(counts) > self.capacity:
+            cut = np.partition(counts, len(counts) - self.capacity - 1)[
+                len(counts) - self.capacity - 1]
+            keep = counts > cut
+            keys, counts = keys[keep], counts[keep] - cut
+            self.decrement += int(cut)
+
+        names = self.names
+        new = [k for k in keys.tolist() if k not in names]
+        names.update(zip(new, render(np.array(new, dtype=np.uint64))))
+        self.names = {k: names[k] for k in keys.tolist()}
+        self.keys, self.counts = keys, counts
+
+    def update(self, words, tokens, offsets):
+        """
+        Count the n-grams of a tokenized text, as `PGalyzer._tokenize`
+        builds it.  Windows that cross a paragraph boundary are dropped.
+        """
+        n = self.n
+        hashes = _word_hashes(words)
+        for a in range(0, max(len(tokens) - n + 1, 0), self.chunk):
+            starts = np.arange(a, min(a + self.chunk, len(tokens) - n + 1))
+            para = np.searchsorted(offsets, starts, side='right')
+            starts = starts[para == np.searchsorted(offsets, starts + n - 1,
+                                                    side='right')]
+
+            keys = np.full(len(starts), n, dtype=np.uint64)
+            for j in range(n):
+                keys = _mix(keys ^ hashes[tokens[starts + j]])
+            self.total += len(keys)
+            for row, columns in enumerate(self._columns(keys)):
+                self.table[row] += np.bincount(columns, minlength=self.width)
+
+            keys, first, counts = np.unique(keys, return_index=True,
+                                            return_counts=True)
+
+            def render(new):
+                ids = tokens[starts[first[np.searchsorted(keys, new)],
+                                    None] + np.arange(n)]
+                return [' '.join(words[i] for i in row)
+                        for row in ids.tolist()]
+            self._add(keys, counts, render)
+
+    def merge(self, other):
+        """Add the counts of another sketch of the same shape."""
+        if (other.n, other.table.shape) != (self.n, self.table.shape):
+            raise ValueError('Only sketches of the same n and memory budget '
+                             'can be merged.')
+        self.table += other.table
+        self.total += other.total
+        self.decrement += other.decrement
+        self._add(other.keys, other.counts,
+                  lambda new: [other.names[k] for k in new.tolist()])
+
+    def ranked(self, top=None, min_count=None):
+        """
+        Return the `(ngram, count)` tuples of the summary by decreasing
+        estimated count, then alphabetically ignoring case.
+        """
+        estimates = self.counts + self.decrement
+        for row, columns in enumerate(self._columns(self.keys)):
+            estimates = np.minimum(estimates, self.table[row, columns])
+
+        ranked = sorted(zip(map(self.names.__getitem__, self.keys.tolist()),
+                            estimates.tolist()),
+                        key=lambda x: (-x[1], x[0].lower(), x[0]))
+        if min_count is not None:
+            ranked = [x for x in ranked if x[1] >= min_count]
+        if top is not None:
+            ranked = ranked[:max(top, 0)]
+        return ranked
+
+
+def _cumulative_lengths(words, tokens):
+    """
+    Return the cumulative word lengths of `tokens`: element `i` is the
+    number of characters of the words of `tokens[:i]`, without spaces.
+    """
+    lengths = np.fromiter(map(len, words), dtype=np.int64, count=len(words))
+    chars = np.zeros(len(tokens) + 1, dtype=np.int64)
+    np.cumsum(lengths[tokens], out=chars[1:])
+    if chars[-1] <= np.iinfo(np.int32).max:
+        chars = chars.astype(np.int32)
+    return chars
+
+
+class Concordance(Sequence):
+    """
+    Occurrences of a word or phrase, as returned by
+    `PGalyzer.concordance`.
+
+    A sequence of `(string_before, string_after)` tuples in order of
+    appearance, which only holds token positions: the strings of an
+    occurrence are rendered from the word IDs of the text each time it
+    is accessed.  It compares equal to a list of the same tuples, and
+    slicing it gives another `Concordance`.
+
+    Occurrence `i` is made of the tokens `backward[i]:starts[i]`
+    before it, `starts[i]:ends[i]` of the match itself and
+    `ends[i]:forward[i]` after it.  `chars`, if given, holds the
+    cumulative word lengths of `tokens` (see `_cumulative_lengths`).
+    """
+    __slots__ = ('words', 'tokens', 'backward', 'starts', 'ends', 'forward',
+                 'chars')
+
+    def __init__(self, words, tokens, backward, starts, ends, forward,
+                 chars=None):
+        self.words = words
+        self.tokens = tokens
+        self.backward = backward
+        self.starts = starts
+        self.ends = ends
+        self.forward = forward
+        self.chars = chars
+
+    def _render(self, start, end):
+        """Join the words of the tokens `start:end` with spaces."""
+        return ' '.join(map(self.words.__getitem__,
+                            self.tokens[start:end].tolist()))
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return Concordance(self.words, self.tokens, self.backward[i],
+                               self.starts[i], self.ends[i], self.forward[i],
+                               self.chars)
+        return (self._render(self.backward[i], self.starts[i]),
+                self._render(self.ends[i], self.forward[i]))
+
+    def __iter__(self):
+        for b, s, e, f in zip(self.backward.tolist(), self.starts.tolist(),
+                              self.ends.tolist(), self.forward.tolist()):
+            yield self._render(b, s), self._render(e, f)
+
+    def __eq__(self, other):
+        if isinstance(other, (Concordance, list, tuple)):
+            return len(self) == len(other) and list(self) == list(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(list(self))
+
+    def matches(self):
+        """Yield the text matched by each occurrence."""
+        for s, e in zip(self.starts.tolist(), self.ends.tolist()):
+            yield self._render(s, e)
+
+    def width(self):
+        """
+        Return the length of the longest `string_before`, from the
+        cumulative word lengths of the text and without rendering any
+        string.
+        """
+        if not len(self):
+            return 0
+        if self.chars is None:
+            self.chars = _cumulative_lengths(self.words, self.tokens)
+        # Letters of the words, plus the spaces between them
+        widths = (self.chars[self.starts].astype(np.int64)
+                  - self.chars[self.backward]
+                  + np.maximum(self.starts - self.backward - 1, 0))
+        return int(widths.max())
+
+    def lines(self, markup=('<b>', '</b>')):
+        """
+        Yield the lines of `PGalyzer.display_concordance` one at a
+        time: each `string_before`, right-aligned on the longest one,
+        then the matched text between the two strings of `markup`,
+        then `string_after`.
+        """
+        width = self.width()
+        start, end = markup
+        for (before, after), match in zip(self, self.matches()):
+            yield (' ' * (width - len(before)) + before + ' ' + start
+                   + match + end + ' ' + after)
+
+
+class _NgramTrie:
+    """
+    Counts of the n-grams of up to `order` words in a trie of arrays,
+    for predicting the word after a context of up to `order - 1`
+    words.
+
+    Level `d` of the trie holds the distinct d-grams, level 0 being
+    the empty context.  Each node is identified by its index `i` in its
+    level and stored as the code `parent * size + word`, where `parent`
+    is the index of its first d-1 words in level d-1.  Codes are sorted,
+    so a child is found with one binary search and the children of a
+    node form a contiguous range.  `ranked[d]` lists the nodes of level
+    d grouped in the same ranges, but by decreasing count, then
+    alphabetically, so the top n successors of any context are the
+    first n of its range and need no sorting at query time.
+
+    With `reverse`, the n-grams are stored backwards, to predict the
+    word before a context.
+    """
+    def __init__(self, table, size, rank, reverse=False):
+        self.size = size
+        self.order = max(table)
+        self.codes = [np.zeros(1, dtype=np.int64)]
+        self.counts = [np.zeros(1, dtype=np.int64)]
+        self.ranked = [np.zeros(1, dtype=np.int64)]
+
+        for k in range(1, self.order + 1):
+            ids, counts = table[k]
+            ids = np.asarray(ids)[:, ::-1] if reverse else np.asarray(ids)
+            counts = np.asarray(counts)
+            keep = counts > 0
+
+            # Index of the first k-1 words of each n-gram in level k-1
+            parent = np.zeros(len(ids), dtype=np.int64)
+            for j in range(k - 1):
+                level = np.append(self.codes[j + 1], -1)
+                code = parent * size + ids[:, j]
+                parent = np.searchsorted(level[:-1], code)
+                keep &= level[parent] == code
+
+            codes = parent[keep] * size + ids[keep, k - 1]
+            order = np.argsort(codes, kind='stable')
+            codes, counts = codes[order], counts[keep][order]
+            self.codes.append(codes)
+            self.counts.append(counts)
+            self.ranked.append(np.lexsort((rank[codes % size], -counts,
+                                           codes // size)))
+
+    def find(self, context):
+        """
+        Return the node of the word IDs of `context`, or None if the
+        context was never seen.
+        """
+        node = 0
+        for d, word in enumerate(context, 1):
+            code = node * self.size + word
+            level = self.codes[d]
+            node = int(np.searchsorted(level, code))
+            if node == len(level) or level[node] != code:
+                return None
+        return node
+
+    def top(self, node, depth, n):
+        """
+        Return the word IDs and counts of the `n` most frequent
+        successors of `node` at level `depth`, with the same semantics
+        as slicing the full list with `[:n]`.
+        """
+        if depth >= self.order:
+            return [], []
+        level = self.codes[depth + 1]
+        start, end = np.searchsorted(level, [node * self.size,
+                                             (node + 1) * self.size]).tolist()
+        end = min(end, start + n) if n >= 0 else max(start, end + n)
+        index = self.ranked[depth + 1][start:end]
+        return ((level[index] % self.size).tolist(),
+                self.counts[depth + 1][index].tolist())
+
+    def nbytes(self):
+        """Return the memory held by the arrays of the trie."""
+        return sum(a.nbytes for arrays in (self.codes, self.counts,
+                                           self.ranked) for a in arrays)
+
+
+class Cooccurrence:
+    """
+    Sparse matrix of the number of times two words are found near each
+    other, as built by `PGalyzer.cooccurrence`.
+
+    Entry `(a, b)` counts the pairs of tokens of word `a` followed by
+    word `b` at most `window` tokens later in the same paragraph, so a
+    window of 1 gives the bigram counts and the matrix plus its
+    transpose gives unordered counts.  Rows and columns are the word
+    IDs of `words`.  The matrix is stored in CSR form, with the column
+    indices of each row sorted: `scipy.sparse.csr_matrix((data,
+    indices, indptr), shape=shape)` wraps the arrays without copying.
+    """
+    def __init__(self, words, window, indptr, indices, data):
+        self.words = words
+        self.vocab = dict(zip(words, range(len(words))))
+        self.window = window
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.shape = (len(words), len(words))
+
+    def rows(self):
+        """Return the row (first word ID) of every entry of `data`."""
+        return np.repeat(np.arange(self.shape[0], dtype=np.int32),
+                         np.diff(self.indptr))
+
+    def get(self, first, second):
+        """Return the count of the word `first` followed by `second`."""
+        if first not in self.vocab or second not in self.vocab:
+            return 0
+        row, column = self.vocab[first], self.vocab[second]
+        start, end = self.indptr[row:row + 2].tolist()
+        i = start + int(np.searchsorted(self.indices[start:end], column))
+        if i < end and self.indices[i] == column:
+            return int(self.data[i])
+        return 0
+
+    def scores(self):
+        """
+        Return the collocation measures of every entry, as a dict of
+        arrays aligned with `data`, computed on the whole matrix at
+        once.
+
+        With `N` the total of the matrix, `O` an entry and `R` and `C`
+        the totals of its row and column, the expected count is
+        `E = R * C / N`, and:
+
+        - `pmi` is `log2(O / E)`
+        - `t_score` is `(O - E) / sqrt(O)`
+        - `log_likelihood` is Dunning's `G2 = 2 * sum(O * ln(O / E))`
+          over the four cells of the 2x2 contingency table of the pair
+        """
+        observed = self.data.astype(np.float64)
+        total = observed.sum()
+        row_totals = np.bincount(self.rows(), weights=observed,
+                                 minlength=self.shape[0])
+        column_totals = np.bincount(self.indices, weights=observed,
+                                    minlength=self.shape[1])
+        first = row_totals[self.rows()]
+        second = column_totals[self.indices]
+        expected = first * second / total
+
+        # Cells of the contingency table: both words, only one, neither
+        cells = ((observed, first, second),
+                 (first - observed, first, total - second),
+                 (second - observed, total - first, second),
+                 (total - first - second + observed, total - first,
+                  total - second))
+        log_likelihood = np.zeros(len(observed))
+        for cell, margin1, margin2 in cells:
+            cell_expected = margin1 * margin2 / total
+            found = cell > 0
+            log_likelihood[found] += cell[found] * np.log(
+                cell[found] / cell_expected[found])
+
+        return {'pmi': np.log2(observed / expected),
+                'log_likelihood': 2 * log_likelihood,
+                't_score': (observed - expected) / np.sqrt(observed)}
+
 
 class PGalyzer:
-    def __init__(self, text_file, clean_pg=False):
+    def __init__(self, text_file, clean_pg=False, cache_dir=None,
+                 cache_size=CACHE_SIZE, profile=False, workers=1):
+        """
+        Create a PGalyzer object.
+
+        This method initializes a PGalyzer object.  This has two
+        modes: the first to simply load the file; the second to
+        parse and clean the file.  Cleaning entails the following:
+            - Removing certain punctuations
+            - Removing headers and footers
+            - Joining sentences in one paragraph
+            - Convert all text to lowercase
+
+        Loaded text data is saved under the text attribute.
+
+        Parameters
+        ----------
+        text_file: string
+            Filepath of a Project Gutenberg file
+        clean_pg: boolean
+            Flag for cleaning
+        cache_dir: string
+            If given, directory of an on-disk cache of the cleaned text
+            and of the token and count arrays, reused by later
+            PGalyzer objects of a file with the same contents
+        cache_size: int
+            Maximum size of the cache in bytes (default: 1 GiB)
+        profile: boolean or string
+            If True, record the time spent in each stage of the
+            analysis, and the characters and tokens it processed, in
+            the `stats` attribute; if 'memory', also record the peak
+            allocation of each stage.  See `Stats`.
+        workers: int
+            Number of processes cleaning the file at the same time
+            when `clean_pg` is True; worthwhile for files of hundreds
+            of MB on several cores
+
+        Returns
+        -------
+        : a PGalyzer object
+            Loaded text data from file as saved under the text
+            attribute
+
+        Examples
+        --------
+        >>> analyzer = PGalyzer('pg_start_only.txt', clean_pg=True)
+        "produced by roger squires a study in scarlet by a conan doyle 1"
+
+        >>> test_file = "/mnt/data/public/gutenberg/2/6/2/0/26206/26206.txt"
+        >>> analyzer = PGalyzer(test_file, True)
+        >>> analyzer.text[:200]
+        "produced by greg weeks dave lovelace stephen blundell and the online"
+        "distributed proofreading team at httpwwwpgdpnet\n_pandemic_\n_by j f"
+        "bone_\n        _generally           human beings don't do       t"
+
+        """
+        self.stats = Stats(bool(profile), profile == 'memory')
+
+        # Reuse an earlier analysis of the same file contents
+        self._cache = None
+        text = None
+        if cache_dir is not None and isinstance(text_file, str):
+            self._cache = _AnalysisCache(cache_dir, text_file, clean_pg,
+                                         cache_size)
+            with self.stats.stage('cache'):
+                text = self._cache.load_text('text')
+
+        # Load (and clean) the file contents
+        if text is None:
+            if clean_pg:
+                chunks = clean_pg_chunks(text_file, self.stats, workers)
+            else:
+                chunks = self.stats.iterate('read', _read_chunks(text_file),
+                                            chars=True)
+            with self.stats.stage('join'):
+                text = ''.join(chunks)
+            if self._cache is not None:
+                self._cache.save_text('text', text)
+
+        self.text = text
+        if self._cache is not None:
+            self._cache.text = text
+
+        # Tokenized form of `text`, built on first use by `_tokenize`
+        self._tokenized = None
+
+    @classmethod
+    def from_corpus(cls, paths, clean_pg=False, n=1, workers=None,
+                    cache_dir=None, cache_size=CACHE_SIZE, approx=False,
+                    memory_budget=MEMORY_BUDGET, profile=False):
+        """
+        Count the words and n-grams of many files at once.
+
+        Each file is loaded (and cleaned) and its n-grams are counted
+        in a pool of `workers` processes.  The per-file counts are then
+        merged in the order of `paths`, so the result does not depend
+        on the number of workers and is the same as analyzing all the
+        files as one text.  Only the counts are kept, not the text.
+
+        Parameters
+        ----------
+        paths: list of string
+            Filepaths of Project Gutenberg files
+        clean_pg: boolean
+            Flag for cleaning
+        n: int or list of int
+            Sizes of the n-grams to count; word counts are always
+            included
+        workers: int
+            Number of processes (default: number of CPUs); with 1,
+            the files are processed in this process
+        cache_dir: string
+            Directory of the on-disk cache of each file's analysis
+        cache_size: int
+            Maximum size of the cache in bytes
+        approx: boolean
+            Count the n-grams approximately, in at most `memory_budget`
+            bytes per size; see `ngrams`
+        memory_budget: int
+            Memory of the approximate counts of each size, in bytes
+        profile: boolean or string
+            As in `PGalyzer`; the counting of all the files is timed
+            as a single 'corpus' stage
+
+        Returns
+        -------
+        : a PGalyzer object
+            Supports `word_count` and `ngrams` for the sizes in `n`,
+            with `approx` and `memory_budget` as given here
+
+        Examples
+        --------
+        >>> corpus = PGalyzer.from_corpus(['1342.txt', '2701.txt'],
+        ...                               clean_pg=True, n=[1, 2])
+        >>> corpus.ngrams(2, top=3)
+        Counter({'of the': 5719, 'in the': 3211, 'to the': 2076})
         """
-        Create a PGalyzer object.
+        sizes = sorted({1}.union(_ngram_sizes(n)))
+        stats = Stats(bool(profile), profile == 'memory')
+        with stats.stage('corpus'):
+            analyzer = cls._count_corpus(paths, clean_pg, sizes, workers,
+                                         cache_dir, cache_size, approx,
+                                         memory_budget)
+        analyzer.stats = stats
+        return analyzer
 
-        This method initializes a PGalyzer object.  This has two
-        modes: the first to simply load the file; the second to
-        parse and clean the file.  Cleaning entails the following:
-            - Removing certain punctuations
-            - Removing headers and footers
-            - Joining sentences in one paragraph
-            - Convert all text to lowercase
+    @classmethod
+    async def aload_many(cls, paths, clean_pg=False, n=1,
+                         concurrency=LOAD_CONCURRENCY, executor=None,
+                         read=_read_bytes):
+        """
+        Load many files asynchronously, yielding each PGalyzer object
+        as soon as its file is done.
+
+        The contents of up to `concurrency` files are read at the same
+        time in a pool of threads, while the files already read are
+        cleaned and counted in `executor`, so slow storage and the CPU
+        are kept busy together.  A file only starts loading when fewer
+        than `concurrency` files are being loaded or are waiting to be
+        consumed, so memory stays bounded however slowly the results
+        are used.
+
+        Parameters
+        ----------
+        paths: iterable of string
+            Filepaths of Project Gutenberg files
+        clean_pg: boolean
+            Flag for cleaning
+        n: int or list of int
+            Sizes of the n-grams to count once a file is loaded; None
+            counts nothing
+        concurrency: int
+            Number of files loading or waiting to be consumed at a time
+        executor: concurrent.futures.Executor
+            Where files are cleaned and counted (default: the event
+            loop's thread pool); a ProcessPoolExecutor spreads them
+            over several cores
+        read: callable
+            Function returning the bytes of a path, called in a thread
+
+        Yields
+        ------
+        : tuple
+            `(path, analyzer)`, in order of completion
+
+        Examples
+        --------
+        >>> async def main(paths):
+        ...     async for path, analyzer in PGalyzer.aload_many(
+        ...             paths, clean_pg=True, concurrency=8):
+        ...         print(path, analyzer.word_count(top=1))
+        >>> asyncio.run(main(glob('books/*.txt')))
+        """
+        sizes = [] if n is None else sorted({1}.union(_ngram_sizes(n)))
+        loop = asyncio.get_running_loop()
+
+        async def load(path, readers):
+            data = await loop.run_in_executor(readers, read, path)
+            analyzer = await loop.run_in_executor(
+                executor, _load_contents, (data, clean_pg, sizes))
+            return path, analyzer
+
+        paths = iter(paths)
+        pending = set()
+        readers = ThreadPoolExecutor(max_workers=concurrency)
+        try:
+            while True:
+                # Start new files while there is room
+                for path in islice(paths, concurrency - len(pending)):
+                    pending.add(asyncio.ensure_future(load(path, readers)))
+                if not pending:
+                    return
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+            readers.shutdown(wait=False)
+
+    @classmethod
+    def _count_corpus(cls, paths, clean_pg, sizes, workers, cache_dir,
+                      cache_size, approx, memory_budget):
+        """Count and merge the files of `from_corpus`."""
+        if approx:
+            jobs = [(path, clean_pg, sizes, cache_dir, cache_size,
+                     memory_budget) for path in paths]
+            if workers == 1:
+                return cls._merge_sketches(map(_sketch_file, jobs))
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                return cls._merge_sketches(pool.map(_sketch_file, jobs))
+
+        jobs = [(path, clean_pg, sizes, cache_dir, cache_size)
+                for path in paths]
+        if workers == 1:
+            partials = map(_count_file, jobs)
+            return cls._merge_counts(partials, sizes)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            partials = pool.map(_count_file, jobs)
+            return cls._merge_counts(partials, sizes)
+
+    @classmethod
+    def from_stream(cls, text_file, clean_pg=False, n=1, approx=False,
+                    memory_budget=MEMORY_BUDGET, profile=False):
+        """
+        Count the words and n-grams of a file or stream without
+        holding its text in memory.
+
+        The text is read (and cleaned) in chunks and counted a batch of
+        whole lines at a time, so n-grams never cross a batch.  The
+        counts are the same as those of `PGalyzer(text_file, clean_pg)`
+        but memory grows with the number of distinct n-grams rather
+        than with the length of the text.  With `approx`, the batches
+        are added to one sketch per size and memory stays within
+        `memory_budget`.  When cleaning, the text after a footer marker
+        is still held until the next marker, as in `clean_pg_chunks`.
+
+        Parameters
+        ----------
+        text_file: string or tuple
+            Filepath of a Project Gutenberg file, or `(first_line,
+            stream)` for standard input
+        clean_pg: boolean
+            Flag for cleaning
+        n: int or list of int
+            Sizes of the n-grams to count; word counts are always
+            included
+        approx: boolean
+            Count the n-grams approximately; see `ngrams`
+        memory_budget: int
+            Memory of the approximate counts of each size, in bytes
+        profile: boolean or string
+            As in `PGalyzer`
+
+        Returns
+        -------
+        : a PGalyzer object
+            Supports `word_count` and `ngrams` for the sizes in `n`,
+            with `approx` and `memory_budget` as given here
+
+        Examples
+        --------
+        >>> with open('dump.txt') as f:
+        ...     counts = PGalyzer.from_stream((f.readline(), f), n=2)
+        >>> counts.word_count(top=3)
+        Counter({'the': 9311541, 'of': 5213870, 'and': 4791244})
+        """
+        sizes = sorted({1}.union(_ngram_sizes(n)))
+        stats = Stats(bool(profile), profile == 'memory')
+        if clean_pg:
+            chunks = clean_pg_chunks(text_file, stats)
+        else:
+            chunks = stats.iterate('read', _read_chunks(text_file),
+                                   chars=True)
+
+        def parts():
+            for text in _line_batches(chunks):
+                part = cls.__new__(cls)
+                part.text = text
+                part._cache = None
+                part._tokenized = None
+                part.stats = stats
+                part._tokenize()
+                yield part
+
+        if approx:
+            sketches = {k: _NgramSketch(k, memory_budget) for k in sizes}
+            for part in parts():
+                with stats.stage('sketch'):
+                    for sketch in sketches.values():
+                        sketch.update(part._words, part._tokens,
+                                      part._offsets)
+                    stats.add('sketch', tokens=len(part._tokens))
+            analyzer = cls._merge_sketches([sketches])
+        else:
+            # Add each batch to the counts so far, as `append` does
+            analyzer = cls._merge_counts([], sizes)
+            analyzer._ngram_index = {}
+            vocab = analyzer._vocab
+            for part in parts():
+                with stats.stage('merge'):
+                    ids = np.fromiter((vocab.setdefault(w, len(vocab))
+                                       for w in part._words),
+                                      dtype=np.int32, count=len(part._words))
+                    analyzer._append_ngrams(part, ids, len(vocab))
+            analyzer._words = list(vocab)
+            analyzer._ngram_index = {}
+        analyzer.stats = stats
+        return analyzer
+
+    @classmethod
+    def from_export(cls, path):
+        """
+        Load counts saved by `export`.
+
+        A directory of `.npy` files is loaded memory-mapped, so no
+        array is copied or parsed until it is used; a `.npz` file is
+        read into memory.  Only the vocabulary is decoded.
+
+        Parameters
+        ----------
+        path: string
+            `.npz` file or directory written by `export`
+
+        Returns
+        -------
+        : a PGalyzer object
+            Supports `word_count` and `ngrams` for the exported sizes,
+            and `likely_next` and `likely_previous` if the bigram
+            tables were exported.  Queries give the same results as on
+            the exporting object, for the rows that were exported.
+
+        Examples
+        --------
+        >>> PGalyzer('1342.txt', clean_pg=True).export('1342', n=[1, 2],
+        ...                                            format='npy')
+        >>> counts = PGalyzer.from_export('1342')
+        >>> counts.ngrams(2, top=3)
+        Counter({'of the': 464, 'to be': 436, 'in the': 382})
+        """
+        if isdir(path):
+            arrays = {name[:-len('.npy')]: np.load(join(path, name),
+                                                   mmap_mode='r')
+                      for name in os.listdir(path) if name.endswith('.npy')}
+        else:
+            with np.load(path) as f:
+                arrays = dict(f)
+        if int(arrays.get('version', -1)) != EXPORT_VERSION:
+            raise ValueError('{} is not an export of this version of '
+                             'PGalyzer.'.format(path))
+
+        analyzer = cls._merge_counts([], [])
+        words = arrays['words_data'].tobytes().decode('utf-8')
+        analyzer._words = words.split('\n')[:-1]
+        analyzer._vocab = dict(zip(analyzer._words,
+                                   range(len(analyzer._words))))
+        for name in arrays:
+            if name.startswith('ngrams_') and name.endswith('_ids'):
+                k = int(name.split('_')[1])
+                analyzer._ngram_table[k] = (
+                    arrays[name], arrays['ngrams_{}_counts'.format(k)])
+        if 'bigrams_next_ids' in arrays:
+            analyzer._bigrams = {
+                direction: tuple(
+                    arrays['bigrams_{}_{}'.format(direction, field)]
+                    for field in ('indptr', 'ids', 'counts'))
+                for direction in ('next', 'previous')}
+        return analyzer
+
+    @classmethod
+    def _merge_counts(cls, partials, sizes, batch=64):
+        """
+        Merge per-file `(words, table)` counts, as returned by
+        `_count_file`, into a new PGalyzer object.
+
+        Files are merged in order, `batch` at a time, so the n-grams
+        keep their order of first appearance in the whole corpus.
+        """
+        analyzer = cls.__new__(cls)
+        analyzer.text = None
+        analyzer._tokenized = None
+        analyzer._cache = None
+        analyzer.stats = Stats()
+        analyzer._sketches = {}
+        analyzer._bigrams = None
+        analyzer._tries = {}
+        analyzer._alphabet = None
+        analyzer._vocab = {}
+        analyzer._ngram_table = {k: (np.zeros((0, k), dtype=np.int32),
+                                     np.zeros(0, dtype=np.int64))
+                                 for k in sizes}
+
+        partials = iter(partials)
+        for chunk in iter(lambda: list(islice(partials, batch)), []):
+            # Map the word IDs of each file to corpus-wide IDs
+            vocab = analyzer._vocab
+            mapped = []
+            for words, table in chunk:
+                ids = np.fromiter((vocab.setdefault(w, len(vocab))
+                                   for w in words),
+                                  dtype=np.int32, count=len(words))
+                mapped.append({k: (ids[table[k][0]], table[k][1])
+                               for k in sizes})
+
+            for k in sizes:
+                ids, counts = analyzer._ngram_table[k]
+                ids = np.concatenate([ids] + [m[k][0] for m in mapped])
+                counts = np.concatenate([counts] + [m[k][1] for m in mapped])
+                analyzer._ngram_table[k] = _sum_rows(ids, counts,
+                                                     len(vocab))
+
+        analyzer._words = list(analyzer._vocab)
+        return analyzer
+
+    @classmethod
+    def _merge_sketches(cls, partials):
+        """
+        Merge per-file sketches, as returned by `_sketch_file`, into a
+        new PGalyzer object.
+        """
+        analyzer = cls.__new__(cls)
+        analyzer.text = None
+        analyzer._tokenized = None
+        analyzer._cache = None
+        analyzer.stats = Stats()
+        analyzer._ngram_table = {}
+        analyzer._sketches = {}
+        analyzer._bigrams = None
+        analyzer._tries = {}
+        analyzer._alphabet = None
+        for sketches in partials:
+            for k, sketch in sketches.items():
+                key = (k, sketch.memory_budget)
+                if key in analyzer._sketches:
+                    analyzer._sketches[key].merge(sketch)
+                else:
+                    analyzer._sketches[key] = sketch
+        return analyzer
+
+    def append(self, text_file=None, clean_pg=False, *, text=None):
+        """
+        Add text to the analyzer and update what has been computed so
+        far, without going over the existing text again.
+
+        The new text is added as new paragraphs: the `text` attribute
+        becomes `text + '\\n' + new_text`, and every query gives the
+        same result as a new PGalyzer object with that text.  Only the
+        new text is cleaned and counted, and the existing counts and
+        indexes are extended rather than rebuilt.  Approximate counts
+        (`approx=True`) keep their error bounds, but may differ from
+        those of a new object.
+
+        Parameters
+        ----------
+        text_file: string or tuple
+            Filepath of a file to add, or `(first_line, stream)` as for
+            standard input
+        clean_pg: boolean
+            Flag for cleaning the new text, as in `PGalyzer`
+        text: string
+            Keyword-only: the text itself, given instead of `text_file`
+
+        Examples
+        --------
+        >>> analyzer = PGalyzer('chapter1.txt', clean_pg=True)
+        >>> analyzer.append('chapter2.txt', clean_pg=True)
+        >>> analyzer.append(text='The end.')
+        >>> analyzer.likely_next('the')
+        [('same', 12), ('old', 9), ('first', 7), ('other', 7), ('man', 6)]
+        """
+        if self.text is None:
+            raise ValueError('The text of a corpus loaded with from_corpus '
+                             'is not kept, so text cannot be appended.')
+        if (text_file is None) == (text is None):
+            raise TypeError('append takes either a text_file or text=.')
+
+        # Load (and clean) the new text only
+        chunks = [text] if text is not None else _read_chunks(text_file)
+        stats = self.stats
+        chunks = stats.iterate('read', chunks, chars=True)
+        if clean_pg:
+            chunks = PG_CLEANING.clean(chunks, stats)
+        part = PGalyzer.__new__(PGalyzer)
+        with stats.stage('join'):
+            part.text = ''.join(chunks)
+        part._cache = None
+        part.stats = stats
+        part._tokenized = None
+
+        text = self.text + '\n' + part.text
+        if self._tokenized is not self.text:
+            # Nothing computed yet; everything is built on first use
+            self.text = text
+            return
+
+        # Tokenize the new text, giving new words the next IDs
+        part._tokenize()
+        vocab = self._vocab
+        size = len(vocab)
+        ids = np.fromiter((vocab.setdefault(w, len(vocab))
+                           for w in part._words),
+                          dtype=np.int32, count=len(part._words))
+        self._words.extend(part._words[i]
+                           for i in np.flatnonzero(ids >= size).tolist())
+        size = len(self._words)
+        tokens = ids[part._tokens]
+        start, paragraphs = len(self._tokens), len(self._offsets) - 1
+        self._tokens = np.concatenate([self._tokens, tokens])
+        self._offsets = np.concatenate([self._offsets,
+                                        start + part._offsets[1:]])
+
+        if self._ngram_table:
+            self._append_ngrams(part, ids, size)
+        if self._bigrams is not None:
+            self._append_bigrams(part, ids, size)
+        if self._positions is not None:
+            order = np.argsort(tokens, kind='stable')
+            indptr, (positions, paragraph) = _csr_update(
+                self._positions[0], self._positions[1:], size,
+                tokens[order],
+                (start + order,
+                 paragraphs + np.searchsorted(part._offsets, order,
+                                              side='right') - 1))
+            self._positions = (indptr, positions, paragraph)
+        # New words change the alphabetical order of the suffixes, and
+        # the trie is rebuilt from the updated counts
+        self._chars = None
+        self._suffixes = None
+        self._tries = {}
+        self._cooccurrences = {}
+        for sketch in self._sketches.values():
+            sketch.update(part._words, part._tokens, part._offsets)
+
+        self.text = text
+        self._tokenized = text
+
+    def _append_ngrams(self, part, ids, size):
+        """
+        Add the n-gram counts of `part`, a tokenized PGalyzer object of
+        the appended text whose word IDs map to `ids`, to `_ngram_table`.
+
+        N-grams already counted are found by binary search in a sorted
+        copy of the table's rows, kept in `_ngram_index`.
+        """
+        table = self._ngram_table
+        counted = part._count_ngrams(table.keys())
+        for k, (new_ids, new_counts) in counted.items():
+            old_ids, old_counts = table[k]
+            if k == 1:
+                counts = np.zeros(size, dtype=np.int64)
+                counts[:len(old_counts)] = old_counts
+                counts[ids] += new_counts
+                table[1] = (np.arange(size, dtype=np.int32)[:, None], counts)
+                continue
+
+            # Rows of word IDs compared as raw bytes
+            row = np.dtype((np.void, 4 * k))
+            if k not in self._ngram_index:
+                keys = np.ascontiguousarray(old_ids).view(row).ravel()
+                order = np.argsort(keys)
+                self._ngram_index[k] = (keys[order], order)
+            keys, order = self._ngram_index[k]
+
+            new_ids = ids[new_ids]
+            new_keys = new_ids.view(row).ravel()
+            found = np.searchsorted(keys, new_keys)
+            seen = found < len(keys)
+            seen[seen] = keys[found[seen]] == new_keys[seen]
+
+            counts = np.array(old_counts)
+            counts[order[found[seen]]] += new_counts[seen]
+            unseen = np.flatnonzero(~seen)
+            table[k] = (np.concatenate([old_ids, new_ids[unseen]]),
+                        np.concatenate([counts, new_counts[unseen]]))
+
+            # Keep the index sorted
+            rows = len(old_counts) + np.arange(len(unseen))
+            by_key = np.argsort(new_keys[unseen])
+            where = found[unseen][by_key]
+            self._ngram_index[k] = (
+                np.insert(keys, where, new_keys[unseen][by_key]),
+                np.insert(order, where, rows[by_key]))
+
+    def _append_bigrams(self, part, ids, size):
+        """
+        Add the bigrams of `part`, a tokenized PGalyzer object of the
+        appended text whose word IDs map to `ids`, to `_bigrams`.
+
+        Only the pairs found in the new text move: each is taken out of
+        its group and put back at the place of its new count, found by
+        binary search on `(group, -count, alphabetical rank)`, so no
+        group is sorted again.  The current count of every pair is
+        looked up in `_bigram_pairs`, a sorted array of all the pairs.
+        """
+        mask = part._bigram_mask()
+        codes = ((ids[part._tokens[:-1][mask]].astype(np.int64) << 32)
+                 + ids[part._tokens[1:][mask]])
+        codes, counts = np.unique(codes, return_counts=True)
+
+        # Old and new count of each pair
+        if self._bigram_pairs is None:
+            indptr, neighbors, totals = self._bigrams['next']
+            pairs = ((np.repeat(np.arange(len(indptr) - 1, dtype=np.int64),
+                                np.diff(indptr)) << 32) + neighbors)
+            order = np.argsort(pairs)
+            self._bigram_pairs = (pairs[order], totals[order])
+        pairs, totals = self._bigram_pairs
+        found = np.searchsorted(pairs, codes)
+        seen = found < len(pairs)
+        seen[seen] = pairs[found[seen]] == codes[seen]
+        old = np.zeros(len(codes), dtype=np.int64)
+        old[seen] = totals[found[seen]]
+        totals = np.array(totals)
+        totals[found[seen]] += counts[seen]
+        self._bigram_pairs = (np.insert(pairs, found[~seen], codes[~seen]),
+                              np.insert(totals, found[~seen], counts[~seen]))
+        counts += old
+
+        rank = self._alphabetical_rank()
+        entry = np.dtype([('group', np.int64), ('count', np.int64),
+                          ('rank', np.int64)])
+        for name, key, other in (('next', codes >> 32, codes & 0xffffffff),
+                                 ('previous', codes & 0xffffffff,
+                                  codes >> 32)):
+            indptr, neighbors, totals = self._bigrams[name]
+            lengths = np.zeros(size, dtype=np.int64)
+            lengths[:len(indptr) - 1] = np.diff(indptr)
+            entries = np.empty(len(neighbors), dtype=entry)
+            entries['group'] = np.repeat(np.arange(len(indptr) - 1),
+                                         np.diff(indptr))
+            entries['count'] = -totals
+            entries['rank'] = rank[neighbors]
+
+            # Take out the pairs seen before
+            moved = np.empty(np.count_nonzero(seen), dtype=entry)
+            moved['group'] = key[seen]
+            moved['count'] = -old[seen]
+            moved['rank'] = rank[other[seen]]
+            keep = np.ones(len(entries), dtype=bool)
+            keep[np.searchsorted(entries, moved)] = False
+            entries = entries[keep]
+
+            # Put every pair of the new text back in its place
+            added = np.empty(len(codes), dtype=entry)
+            added['group'] = key
+            added['count'] = -counts
+            added['rank'] = rank[other]
+            order = np.argsort(added)
+            where = np.searchsorted(entries, added[order])
+            neighbors = np.insert(neighbors[keep], where, other[order])
+            totals = np.insert(totals[keep], where, counts[order])
+
+            lengths += (np.bincount(key, minlength=size)
+                        - np.bincount(key[seen], minlength=size))
+            indptr = np.zeros(size + 1, dtype=np.int64)
+            np.cumsum(lengths, out=indptr[1:])
+            self._bigrams[name] = (indptr, neighbors, totals)
+
+    def _alphabetical_rank(self):
+        """
+        Return the rank of each word ID in alphabetical order, used to
+        break ties between bigrams.  Words added by `append` are merged
+        into the ranks already computed.
+        """
+        words = self._words
+        if self._alphabet is None:
+            order = sorted(range(len(words)), key=words.__getitem__)
+            self._alphabet = np.array([words[i] for i in order],
+                                      dtype=object)
+            self._alphabet_rank = np.empty(len(words), dtype=np.int64)
+            self._alphabet_rank[order] = np.arange(len(words))
+        elif len(self._alphabet) < len(words):
+            new = words[len(self._alphabet):]
+            order = sorted(range(len(new)), key=new.__getitem__)
+            alphabet = np.array([new[i] for i in order], dtype=object)
+            where = np.searchsorted(self._alphabet, alphabet)
+            rank = np.empty(len(new), dtype=np.int64)
+            rank[order] = where + np.arange(len(new))
+            self._alphabet_rank = np.concatenate([
+                self._alphabet_rank + np.searchsorted(
+                    where, self._alphabet_rank, side='right'),
+                rank])
+            self._alphabet = np.insert(self._alphabet, where, alphabet)
+        return self._alphabet_rank
+
+    def _valid_cache(self):
+        """
+        Return the on-disk cache, or None if there is no cache or the
+        `text` attribute has been replaced since loading.
+        """
+        if self._cache is not None and self._cache.text is self.text:
+            return self._cache
+        return None
+
+    def _memory_usage(self):
+        """
+        Return a rough estimate of the memory held by the analyzer, in
+        bytes: the text, the vocabulary and every array built so far.
+        """
+        size = len(self.text) if self.text is not None else 0
+        size += 120 * len(getattr(self, '_words', ()))
+
+        arrays = [getattr(self, '_tokens', None),
+                  getattr(self, '_offsets', None)]
+        arrays.extend(getattr(self, '_positions', None) or ())
+        arrays.append(getattr(self, '_chars', None))
+        arrays.extend(getattr(self, '_suffixes', None) or ())
+        for table in (getattr(self, '_bigrams', None) or {}).values():
+            arrays.extend(table)
+        for table in getattr(self, '_ngram_table', {}).values():
+            arrays.extend(table)
+        for index in getattr(self, '_ngram_index', {}).values():
+            arrays.extend(index)
+        arrays.extend(getattr(self, '_bigram_pairs', None) or ())
+        for trie in getattr(self, '_tries', {}).values():
+            size += trie.nbytes()
+        for matrix in getattr(self, '_cooccurrences', {}).values():
+            arrays.extend((matrix.indptr, matrix.indices, matrix.data))
+        for sketch in getattr(self, '_sketches', {}).values():
+            size += 256 * len(sketch.counts)
+            arrays.append(sketch.table)
+        return size + sum(a.nbytes for a in arrays if a is not None)
+
+    def _shard_count(self, workers):
+        """
+        Return the number of shards the text is split into for
+        `workers` processes: one per process, but no smaller than
+        `SHARD_SIZE` characters.  Returns 1 when the text is counted
+        in this process.
+        """
+        if workers == 1 or self.text is None:
+            return 1
+        return max(1, min(workers or os.cpu_count(),
+                          len(self.text) // SHARD_SIZE))
+
+    def _tokenize_parallel(self, shards, workers):
+        """
+        Tokenize the text in `shards` pieces, cut at paragraph
+        boundaries, in a pool of `workers` processes.
+
+        The pieces are copied to shared memory rather than sent to the
+        processes.  Their word IDs are mapped to IDs in order of first
+        appearance in the whole text, so the result is the same as
+        `_tokenize_text(self.text)`.
+        """
+        # Cut at the first newline after each equal share of the text
+        cuts = [0]
+        for i in range(1, shards):
+            cut = self.text.find('\n', i * len(self.text) // shards)
+            if cut < 0:
+                break
+            if cut >= cuts[-1]:
+                cuts.append(cut + 1)
+        cuts.append(len(self.text) + 1)
+        pieces = (self.text[start:end - 1].encode('utf-8')
+                  for start, end in zip(cuts, cuts[1:]))
+
+        vocab = {}
+        tokens = []
+        offsets = [np.zeros(1, dtype=np.int64)]
+        with _shared_buffers(pieces) as jobs, \
+                ProcessPoolExecutor(max_workers=workers) as pool:
+            for words, shard_tokens, shard_offsets in pool.map(
+                    _tokenize_shard, jobs):
+                ids = np.fromiter((vocab.setdefault(w, len(vocab))
+                                   for w in words),
+                                  dtype=np.int32, count=len(words))
+                tokens.append(ids[shard_tokens])
+                offsets.append(shard_offsets[1:] + offsets[-1][-1])
+        return vocab, np.concatenate(tokens), np.concatenate(offsets)
+
+    def _count_parallel(self, sizes, room, parts, workers):
+        """
+        Count the n-grams of the sizes in `sizes`, all above 1, in
+        `parts` parts, in a pool of `workers` processes.
+
+        Every process reads the tokens of the whole text from shared
+        memory and counts the n-grams of its part (see
+        `_count_windows`).  No two parts share an n-gram, so their
+        counts are only put back in order of first appearance, with
+        the same result as `_count_windows` on the whole text.
+        """
+        size = len(self._words)
+        tokens = np.ascontiguousarray(self._tokens, dtype=np.int32)
+        room = np.ascontiguousarray(room, dtype=np.int64)
+        with _shared_buffers([tokens, room]) as blocks, \
+                ProcessPoolExecutor(max_workers=workers) as pool:
+            jobs = [(*blocks, len(tokens), part, parts, size, sizes)
+                    for part in range(parts)]
+            counted = list(pool.map(_count_shard, jobs))
+
+        table = {}
+        for k in sizes:
+            ids, counts, positions = (np.concatenate(arrays) for arrays
+                                      in zip(*(c[k] for c in counted)))
+            # Each position starts one n-gram: sort them by bucketing
+            slot = np.zeros(len(self._tokens), dtype=np.int64)
+            slot[positions] = np.arange(1, len(positions) + 1)
+            order = slot[slot > 0] - 1
+            table[k] = (ids[order], counts[order])
+        return table
+
+    def _tokenize(self, workers=1):
+        """
+        Build the integer-ID representation of the text, if needed.
+
+        Paragraphs are the `\\n`-separated lines of `text` and words
+        are the whitespace-separated items of a paragraph.  The text
+        is split only once and the result is shared by every query
+        method.  It is rebuilt only if the `text` attribute is
+        replaced.  With `workers` other than 1, a large text is split
+        in a pool of processes; see `_tokenize_parallel`.
+
+        Attributes set
+        --------------
+        _vocab: dict
+            Word to integer ID, in order of first appearance
+        _words: list
+            Integer ID to word
+        _tokens: numpy.ndarray of int32
+            Word IDs of the whole text
+        _offsets: numpy.ndarray of int64
+            Start index of each paragraph in `_tokens`, followed by
+            the total number of tokens
+        """
+        if self.text is None:
+            raise ValueError('The text of counts loaded with from_corpus, '
+                             'from_stream or from_export is not kept; '
+                             'only its n-gram counts are '
+                             'available.')
+        if self._tokenized is self.text:
+            return
+
+        with self.stats.stage('tokenize'):
+            cache = self._valid_cache()
+            cached = cache.load('tokens') if cache is not None else None
+            if cached is not None:
+                # Words are saved one per line; they never contain a newline
+                self._words = cache.load_text('words').split('\n')[:-1]
+                self._vocab = dict(zip(self._words, range(len(self._words))))
+                self._tokens = cached['tokens']
+                self._offsets = cached['offsets']
+            else:
+                shards = self._shard_count(workers)
+                if shards > 1:
+                    tokenized = self._tokenize_parallel(shards, workers)
+                else:
+                    tokenized = _tokenize_text(self.text)
+                self._vocab, self._tokens, self._offsets = tokenized
+                self._words = list(self._vocab)
+
+                if cache is not None:
+                    cache.save_text('words', ''.join(w + '\n'
+                                                     for w in self._words))
+                    cache.save('tokens', tokens=self._tokens,
+                               offsets=self._offsets)
+            self._tokenized = self.text
+            self.stats.add('tokenize', chars=len(self.text),
+                           tokens=len(self._tokens))
+
+        # Indexes derived from the tokens are rebuilt on demand
+        self._bigrams = None
+        self._tries = {}
+        self._cooccurrences = {}
+        self._positions = None
+        self._chars = None
+        self._suffixes = None
+        self._ngram_table = {}
+        self._ngram_index = {}
+        self._bigram_pairs = None
+        self._alphabet = None
+        self._sketches = {}
+
+    def _paragraph_room(self):
+        """
+        Return the number of tokens from each token to the end of its
+        paragraph, the token itself included.
+        """
+        return (np.repeat(self._offsets[1:], np.diff(self._offsets))
+                - np.arange(len(self._tokens)))
+
+    def _bigram_mask(self):
+        """
+        Return a boolean mask over `_tokens[:-1]` that is True where
+        the token and the one after it are in the same paragraph.
+        """
+        mask = np.ones(max(len(self._tokens) - 1, 0), dtype=bool)
+        ends = self._offsets[1:-1] - 1
+        mask[ends[(ends >= 0) & (ends < len(mask))]] = False
+        return mask
+
+    def _build_bigrams(self, workers=1):
+        """
+        Build (once) the bigram index shared by `likely_next` and
+        `likely_previous`.
+
+        Each distinct `(previous, next)` pair of words in a paragraph
+        is stored once along with its count.  The pairs are kept in two
+        orders: grouped by previous word for `likely_next`, and grouped
+        by next word for `likely_previous`.  Within a group, pairs are
+        sorted by decreasing count, then alphabetically, so the top `n`
+        words of any group are simply its first `n` entries.  With
+        `workers` other than 1, the pairs of a large text are counted
+        in a pool of processes, as the 2-grams of `_count_ngrams`.
+
+        Attributes set
+        --------------
+        _bigrams: dict
+            'next' and 'previous' map to `(indptr, ids, counts)`, where
+            the neighbors of word ID `w` are `ids[indptr[w]:indptr[w+1]]`
+        """
+        # Counts loaded without their text only have exported tables
+        if self.text is not None or self._bigrams is None:
+            self._tokenize(workers)
+        if self._bigrams is not None:
+            return
+
+        with self.stats.stage('bigrams'):
+            cache = self._valid_cache()
+            if cache is not None:
+                cached = [cache.load('bigrams-' + name)
+                          for name in ('next', 'previous')]
+                if None not in cached:
+                    self._bigrams = {
+                        name: (arrays['indptr'], arrays['ids'],
+                               arrays['counts'])
+                        for name, arrays in zip(('next', 'previous'), cached)}
+                    return
+
+            # Count each distinct pair as a single int64 key
+            size = len(self._words)
+            if self._shard_count(workers) > 1:
+                pairs, counts = self._count_ngrams([2], workers)[2]
+                keys = pairs[:, 0].astype(np.int64) * size + pairs[:, 1]
+            else:
+                mask = self._bigram_mask()
+                keys = (self._tokens[:-1][mask].astype(np.int64) * size
+                        + self._tokens[1:][mask])
+                keys, counts = np.unique(keys, return_counts=True)
+            prev_ids, next_ids = np.divmod(keys, size)
+
+            # Alphabetical rank of each word ID for tie-breaking
+            rank = self._alphabetical_rank()
+
+            self._bigrams = {}
+            for name, key, other in (('next', prev_ids, next_ids),
+                                     ('previous', next_ids, prev_ids)):
+                order = np.lexsort((rank[other], -counts, key))
+                indptr = np.zeros(size + 1, dtype=np.int64)
+                np.cumsum(np.bincount(key, minlength=size), out=indptr[1:])
+                self._bigrams[name] = (indptr, other[order].astype(np.int32),
+                                       counts[order])
+                if cache is not None:
+                    cache.save('bigrams-' + name, indptr=indptr,
+                               ids=self._bigrams[name][1],
+                               counts=self._bigrams[name][2])
+
+    def _build_positions(self):
+        """
+        Build (once) the positional inverted index used by
+        `concordance`.
+
+        The positions of every word are stored contiguously, in order
+        of appearance, together with the paragraph each one is in.
+
+        Attributes set
+        --------------
+        _positions: tuple
+            `(indptr, positions, paragraphs)`, where the token indices
+            of word ID `w` are `positions[indptr[w]:indptr[w+1]]` and
+            `paragraphs` holds the matching paragraph numbers
+        """
+        self._tokenize()
+        if self._positions is not None:
+            return
+
+        with self.stats.stage('positions'):
+            cache = self._valid_cache()
+            cached = cache.load('positions') if cache is not None else None
+            if cached is not None:
+                self._positions = (cached['indptr'], cached['positions'],
+                                   cached['paragraphs'])
+                return
+
+            positions = np.argsort(self._tokens, kind='stable')
+            if len(positions) <= np.iinfo(np.int32).max:
+                positions = positions.astype(np.int32)
+            paragraphs = (np.searchsorted(self._offsets, positions,
+                                          side='right') - 1).astype(np.int32)
+            indptr = np.zeros(len(self._words) + 1, dtype=np.int64)
+            np.cumsum(np.bincount(self._tokens, minlength=len(self._words)),
+                      out=indptr[1:])
+            self._positions = (indptr, positions, paragraphs)
+            if cache is not None:
+                cache.save('positions', indptr=indptr, positions=positions,
+                           paragraphs=paragraphs)
+
+    def _build_chars(self):
+        """
+        Build (once) the cumulative word lengths of the tokens, used by
+        `display_concordance` to align its lines.
+
+        Attributes set
+        --------------
+        _chars: np.ndarray
+            Element `i` is the number of characters of the words of the
+            first `i` tokens, without spaces
+        """
+        self._tokenize()
+        if self._chars is not None:
+            return
+        with self.stats.stage('chars'):
+            self._chars = _cumulative_lengths(self._words, self._tokens)
+
+    def _build_suffixes(self):
+        """
+        Build (once) the suffix array used by the phrase queries of
+        `concordance`, `display_concordance` and `phrase_count`.
+
+        The suffix starting at each token runs to the end of its
+        paragraph, so no phrase is found across two paragraphs.
+        Suffixes are sorted word by word in alphabetical order of the
+        words, a suffix coming before the longer ones it starts, and
+        equal suffixes in order of position.  The words of a phrase
+        then match a contiguous range of suffixes, and so do the words
+        that start with a given prefix.
+
+        The array is built by prefix doubling: each round sorts the
+        suffixes on the ranks of their first `h` words and of the `h`
+        words after them, which ranks their first `2h` words.  This
+        takes O(N log N) per round, for at most log2 of the longest
+        paragraph rounds.
+
+        Attributes set
+        --------------
+        _suffixes: tuple
+            `(suffixes, codes, room)`, where `suffixes` holds the
+            sorted token indices, `codes` the alphabetical rank plus
+            one of the word of each token, and `room` the number of
+            tokens from each token to the end of its paragraph
+        """
+        self._tokenize()
+        if self._suffixes is not None:
+            return
+
+        with self.stats.stage('suffixes'):
+            tokens = self._tokens
+            codes = (self._alphabetical_rank()[tokens] + 1).astype(np.int32)
+            room = self._paragraph_room().astype(np.int32)
+
+            cache = self._valid_cache()
+            cached = cache.load('suffixes') if cache is not None else None
+            if cached is not None:
+                self._suffixes = (cached['suffixes'], codes, room)
+                return
+
+            # Rank of the first `h` words of each suffix, 0 past its end
+            rank = codes.astype(np.int64)
+            h = 1
+            while h < room.max(initial=0):
+                after = np.zeros(len(tokens), dtype=np.int64)
+                inside = np.flatnonzero(room > h)
+                after[inside] = rank[inside + h]
+                order = np.lexsort((after, rank))
+                first, second = rank[order], after[order]
+                changed = np.empty(len(order), dtype=bool)
+                changed[:1] = True
+                changed[1:] = ((first[1:] != first[:-1])
+                               | (second[1:] != second[:-1]))
+                rank[order] = np.cumsum(changed)
+                h *= 2
+                if changed.all():
+                    break
+
+            suffixes = np.lexsort((np.arange(len(tokens)), rank))
+            self._suffixes = (suffixes, codes, room)
+            self.stats.add('suffixes', tokens=len(tokens))
+            if cache is not None:
+                cache.save('suffixes', suffixes=suffixes)
+
+    def _phrase_range(self, phrase, prefix=False):
+        """
+        Return the range `(start, end)` of the suffixes that start with
+        the words of `phrase`, or with words that start with the last
+        one if `prefix` is True.
+
+        Each word narrows the range with two binary searches, so the
+        range is found in O(k log N) for a phrase of k words.
+        """
+        words = phrase.split()
+        self._build_suffixes()
+        suffixes, codes, room = self._suffixes
+        alphabet = self._alphabet
+
+        start, end = 0, len(suffixes)
+        for j, word in enumerate(words):
+            if prefix and j == len(words) - 1:
+                low = int(np.searchsorted(alphabet, word))
+                high = int(np.searchsorted(alphabet, word + '\U0010ffff'))
+            elif word in self._vocab:
+                low = int(self._alphabet_rank[self._vocab[word]])
+                high = low + 1
+            else:
+                return 0, 0
+
+            def column(i, j=j):
+                # Code of the j-th word of the suffix at token i
+                return codes[i + j] if room[i] > j else 0
+
+            start, end = (bisect_left(suffixes, low + 1, start, end,
+                                      key=column),
+                          bisect_left(suffixes, high + 1, start, end,
+                                      key=column))
+            if start == end:
+                break
+        return start, end
+
+    def _phrase_concordance(self, phrase, neighborhood_size, prefix, page):
+        """
+        Return the `Concordance` of the occurrences of `phrase` in the
+        slice `page` of them, for `concordance` and
+        `display_concordance`.  The text matched differs from `phrase`
+        only for prefix queries.
+        """
+        size = len(phrase.split())
+        start, end = self._phrase_range(phrase, prefix)
+        suffixes, codes, room = self._suffixes
+        indices = np.sort(suffixes[start:end])[page]
+
+        # Context clipped to the paragraph of the occurrence
+        paragraphs = np.searchsorted(self._offsets, indices, side='right') - 1
+        backward = np.maximum(indices - neighborhood_size,
+                              self._offsets[paragraphs])
+        forward = np.minimum(indices + size + neighborhood_size,
+                             indices + room[indices])
+        return Concordance(self._words, self._tokens, backward, indices,
+                           indices + size, forward)
+
+    def phrase_count(self, phrase, prefix=False):
+        """
+        Return the number of times `phrase`, one or more words, is
+        found within a paragraph of the text.
+
+        The first query builds a suffix array of the text (see
+        `_build_suffixes`); every query after it takes O(k log N) for
+        a phrase of k words in a text of N words.
+
+        Parameters
+        ----------
+        phrase: str
+            Words separated by whitespace
+        prefix: boolean
+            Also count the phrases whose last word only starts with
+            the last word of `phrase`
+
+        Returns
+        -------
+        count: int
+            Number of occurrences
+
+        Example
+        -------
+        >>> analyzer.phrase_count('the white whale')
+        27
+        >>> analyzer.phrase_count('the white wh', prefix=True)
+        31
+        """
+        if not phrase.split():
+            return 0
+        start, end = self._phrase_range(phrase, prefix)
+        return end - start
+
+    def _render_rows(self, ids):
+        """
+        Return the strings of the rows of a 2D array of word IDs.
+
+        The words are looked up one column at a time, which is much
+        faster than joining the words of each row on its own.
+        """
+        words = np.array(self._words, dtype=object)
+        return list(map(' '.join, zip(*[words[c].tolist() for c in ids.T])))
+
+    def _count_ngrams(self, ns, workers=1):
+        """
+        Count the n-grams of every size in `ns` on the word IDs.
+
+        An n-gram is identified by an integer code.  The codes of the
+        (k+1)-grams are computed from those of the k-grams and the next
+        word ID, so every size shares the work of the smaller ones.
+        Codes are renumbered densely with `np.unique` whenever they
+        would otherwise overflow int64.  Windows that cross a paragraph
+        boundary are dropped.  Counts are cached per size.
+
+        With `workers` other than 1, a large text is tokenized and its
+        n-grams above size 1 are counted in a pool of processes, with
+        the same result; see `_tokenize_parallel` and
+        `_count_parallel`.
+
+        Parameters
+        ----------
+        ns: iterable of int
+            Sizes of the n-grams to count
+        workers: int
+            Number of processes (None: number of CPUs)
+
+        Returns
+        -------
+        counts: dict
+            Maps each size `n` to `(ids, counts)`, where `ids` is an
+            array of shape `(m, n)` holding the word IDs of the `m`
+            distinct n-grams in order of first appearance
+        """
+        ns = set(_ngram_sizes(list(ns)))
+        if self.text is not None:
+            self._tokenize(workers)
+        if ns <= self._ngram_table.keys():
+            return {k: self._ngram_table[k] for k in ns}
+
+        with self.stats.stage('count'):
+            # Counts saved by an earlier run
+            table = self._ngram_table
+            cache = self._valid_cache()
+            if cache is not None:
+                for k in ns - table.keys():
+                    cached = cache.load('ngrams-{}'.format(k))
+                    if cached is not None:
+                        table[k] = (cached['ids'], cached['counts'])
+            missing = ns - table.keys()
+            if not missing:
+                return {k: table[k] for k in ns}
+
+            self._tokenize(workers)
+            tokens = self._tokens
+            size = len(self._words)
+            self.stats.add('count', tokens=len(tokens))
+
+            if 1 in missing:
+                table[1] = (np.arange(size, dtype=np.int32)[:, None],
+                            np.bincount(tokens, minlength=size))
+
+            longer = {k for k in missing if k > 1}
+            if longer:
+                # Number of tokens left in the paragraph of each token
+                room = self._paragraph_room()
+                parts = self._shard_count(workers)
+                if parts > 1:
+                    table.update(self._count_parallel(longer, room, parts,
+                                                      workers))
+                else:
+                    counted = _count_windows(tokens, room, size, longer)
+                    table.update({k: (ids, counts) for k, (ids, counts, _)
+                                  in counted.items()})
+
+            if cache is not None:
+                for k in missing:
+                    cache.save('ngrams-{}'.format(k), ids=table[k][0],
+                               counts=table[k][1])
+            return {k: table[k] for k in ns}
+
+    def _sketch(self, n, memory_budget):
+        """
+        Return the approximate counts of the n-grams of size `n` as an
+        `_NgramSketch`, building it if needed.  Sketches are cached per
+        size and budget.
+        """
+        if self.text is not None:
+            self._tokenize()
+        key = (n, memory_budget)
+        if key not in self._sketches:
+            self._tokenize()
+            with self.stats.stage('sketch'):
+                sketch = _NgramSketch(n, memory_budget)
+                sketch.update(self._words, self._tokens, self._offsets)
+                self.stats.add('sketch', tokens=len(self._tokens))
+            self._sketches[key] = sketch
+        return self._sketches[key]
+
+    def _rank(self, ids, counts, top=None, min_count=None):
+        """
+        Sort counted n-grams by decreasing count, then alphabetically
+        ignoring case, then by order of first appearance.
+
+        Only the n-grams that make the output are sorted.  The `top`
+        counts are found with `np.partition`, and the n-grams tied at
+        the cutoff count are narrowed down with a heap.
+
+        Parameters
+        ----------
+        ids: numpy.ndarray
+            Word IDs of the n-grams, one row each, in order of first
+            appearance
+        counts: numpy.ndarray
+            Count of each n-gram
+        top: int
+            Keep only the `top` first n-grams (default: all)
+        min_count: int
+            Keep only n-grams that appear at least `min_count` times
+
+        Returns
+        -------
+        ranked: list of tuples
+            `(ngram, count)` in output order
+        """
+        index, ngrams = self._rank_index(ids, counts, top, min_count)
+        return list(zip(ngrams, counts[index].tolist()))
+
+    def _rank_index(self, ids, counts, top=None, min_count=None):
+        """
+        Return the rows of the n-grams that `_rank` outputs, in output
+        order, and their strings.
+        """
+        with self.stats.stage('rank'):
+            index = np.arange(len(counts))
+            if min_count is not None:
+                index = index[counts >= min_count]
+
+            if top is not None and top <= 0:
+                index = index[:0]
+            elif top is not None and top < len(index):
+                kept = counts[index]
+                cutoff = np.partition(kept, len(kept) - top)[len(kept) - top]
+
+                # Only the n-grams tied at the cutoff need their strings
+                ties = index[kept == cutoff]
+                keys = [s.lower() for s in self._render_rows(ids[ties])]
+                picked = heapq.nsmallest(top - int(np.sum(kept > cutoff)),
+                                         range(len(ties)),
+                                         key=keys.__getitem__)
+                index = np.sort(np.concatenate([index[kept > cutoff],
+                                                ties[picked]]))
+
+            # Rank the strings once, then sort by count and rank; both sorts
+            # are stable, so ties keep their order of first appearance
+            ngrams = self._render_rows(ids[index])
+            lower = list(map(str.lower, ngrams))
+            rank = np.empty(len(lower), dtype=np.int64)
+            rank[sorted(range(len(lower)), key=lower.__getitem__)] = \
+                np.arange(len(lower))
+            order = np.lexsort((rank, -counts[index]))
+            return (index[order],
+                    np.array(ngrams, dtype=object)[order].tolist())
+
+    def _ranked_ngrams(self, n, top=None, min_count=None, approx=False,
+                       memory_budget=MEMORY_BUDGET, workers=1,
+                       sort_budget=None):
+        """
+        Return the `(ngram, count)` tuples of size `n` in output order.
+        See `_rank`, and `ngrams` for `approx`, `memory_budget` and
+        `workers`.  With a `sort_budget` in bytes and no `top`, the
+        exact counts are returned as an iterator that sorts them on
+        disk; see `_external_rank`.
+        """
+        _ngram_sizes(n)
+        if approx:
+            return self._sketch(n, memory_budget).ranked(top, min_count)
+        ids, counts = self._count_ngrams([n], workers)[n]
+        if top is None and sort_budget is not None:
+            return self._external_rank(ids, counts, min_count, sort_budget)
+        return self._rank(ids, counts, top, min_count)
+
+    def _external_rank(self, ids, counts, min_count=None,
+                       sort_budget=SORT_BUDGET):
+        """
+        Iterate over the `(ngram, count)` tuples of `_rank` without
+        holding all their strings in memory.
+
+        The n-grams are ranked in runs of about `sort_budget` bytes of
+        strings, which are written to temporary files.  The runs are
+        then merged lazily on `(-count, lowercase n-gram, first
+        appearance)` keys, computed once per line, so the output is in
+        the same order as `_rank`.  A single run is ranked in memory.
+
+        At most `MERGE_FAN_IN` runs are merged at a time: whenever that
+        many runs of the same level exist, they are merged into one run
+        of the next level, and the runs left at the end are merged in
+        groups until few enough remain.  Only a few hundred files are
+        therefore open at once, however small the budget.
+        """
+        index = np.arange(len(counts))
+        if min_count is not None:
+            index = index[counts >= min_count]
 
-        Loaded text data is saved under the text attribute.
+        # Estimated bytes per row: the n-gram, its lowercase copy, the
+        # tuple and the list entries that point to them
+        lengths = np.fromiter(map(len, self._words), dtype=np.int64,
+                              count=len(self._words))
+        width = ids.shape[1] * (lengths.mean() + 1) if len(lengths) else 1
+        rows = max(1, int(sort_budget // (2 * (width + 50) + 120)))
+        if len(index) <= rows:
+            return iter(self._rank(ids[index], counts[index]))
+
+        # levels[k] holds the runs made of MERGE_FAN_IN ** k first runs
+        levels = []
+        try:
+            with self.stats.stage('rank'):
+                for start in range(0, len(index), rows):
+                    chunk = index[start:start + rows]
+                    order, ngrams = self._rank_index(ids[chunk],
+                                                     counts[chunk])
+                    run = _write_run(
+                        '{}\t{}\t{}\n'.format(*line) for line
+                        in zip(counts[chunk[order]].tolist(),
+                               chunk[order].tolist(), ngrams))
+                    level = 0
+                    while True:
+                        if level == len(levels):
+                            levels.append([])
+                        levels[level].append(run)
+                        if len(levels[level]) < MERGE_FAN_IN:
+                            break
+                        run = _merge_group(levels[level])
+                        levels[level] = []
+                        level += 1
+
+                runs = [run for level in levels for run in level]
+                levels = [runs]
+                while len(runs) > MERGE_FAN_IN:
+                    runs[:MERGE_FAN_IN] = [_merge_group(runs[:MERGE_FAN_IN])]
+        except BaseException:
+            for level in levels:
+                for run in level:
+                    run.close()
+            raise
+        return _merge_runs(runs)
+
+    def ngrams(self, n=1, top=None, min_count=None, approx=False,
+               memory_budget=MEMORY_BUDGET, workers=1):
+        """
+        Count the number of times a group of words (defined by n)
+        are found within a file.
 
         Parameters
         ----------
-        text_file: string
-            Filepath of a Project Gutenberg file
-        clean_pg: boolean
-            Flag for cleaning
+        n: int or list of int
+            Number of (consecutive) words to group together, at
+            least 1.  If a list is given, every size is counted in one
+            pass.
+        top: int
+            If given, return only the `top` most frequent n-grams
+        min_count: int
+            If given, return only the n-grams found at least
+            `min_count` times
+        approx: bool
+            If True, estimate the counts of the most frequent n-grams
+            with a Count-Min sketch and a heavy-hitters summary that
+            use at most about `memory_budget` bytes per size, however
+            many distinct n-grams there are
+        memory_budget: int
+            Memory of the approximate counts, in bytes (default: 64 MiB)
+        workers: int
+            Number of processes counting a large text, split at
+            paragraphs (None: number of CPUs); the counts are the same
+            as with 1.  Texts under `SHARD_SIZE` characters per process
+            are counted in this process.
 
         Returns
         -------
-        : a PGalyzer object
-            Loaded text data from file as saved under the text
-            attribute
+        ngrams: dict
+            Count of n-gram repetitions, or a dict mapping each `n`
+            to its counts if `n` is a list.  If `top` or `min_count`
+            is given, the n-grams are in the same order as in the CLI
+            output: by decreasing count, then alphabetically.
+
+        Notes
+        -----
+        With `approx=True`, only the n-grams kept by the heavy-hitters
+        summary are returned: at most `memory_budget / 1024` of them,
+        including every n-gram found more than `N / (capacity + 1)`
+        times, where `N` is the number of n-grams in the text.  The
+        counts are never too low, and too high by at most that same
+        bound, or by `e * N / width` with probability
+        `1 - exp(-depth)`, where the sketch has `depth` rows of `width`
+        counters sharing half of `memory_budget`.
+
+        """
+        sizes = _ngram_sizes(n)
+        if approx:
+            ngrams = {k: Counter(dict(self._ranked_ngrams(
+                          k, top, min_count, True, memory_budget)))
+                      for k in sizes}
+            return ngrams[n] if np.isscalar(n) else ngrams
+
+        table = self._count_ngrams(sizes, workers)
+
+        ngrams = {}
+        for k in sizes:
+            ids, counts = table[k]
+            if top is None and min_count is None:
+                ngrams[k] = Counter(dict(zip(self._render_rows(ids),
+                                             counts.tolist())))
+            else:
+                ngrams[k] = Counter(dict(self._rank(ids, counts, top,
+                                                    min_count)))
+
+        return ngrams[n] if np.isscalar(n) else ngrams
+
+    def word_count(self, top=None, min_count=None, approx=False,
+                   memory_budget=MEMORY_BUDGET, workers=1):
+        """
+        Return the count of each word (characters bounded by whitespace).
+
+        `top` and `min_count` limit the words returned, `approx` and
+        `memory_budget` select approximate counting, and `workers`
+        splits a large text in a pool of processes, as in `ngrams`.
+        """
+        return self.ngrams(1, top=top, min_count=min_count, approx=approx,
+                           memory_budget=memory_budget, workers=workers)
+
+    def export(self, path, n=1, top=None, min_count=None, bigrams=False,
+               approx=False, memory_budget=MEMORY_BUDGET, format='npz',
+               workers=1):
+        """
+        Save n-gram counts, and optionally the bigram tables, as binary
+        columns that `from_export` loads back without parsing.
+
+        The export holds the vocabulary as a string table, and NumPy
+        arrays of word IDs and counts:
+
+        - `words_data`, `words_offsets`: the UTF-8 bytes of the words,
+          each followed by a newline, and the byte offset of each word
+        - `ngrams_{k}_ids`, `ngrams_{k}_counts`: the word IDs, of shape
+          `(m, k)`, and counts of the n-grams of size `k`, in order of
+          first appearance, or in output order if `top`, `min_count`
+          or `approx` is given
+        - `bigrams_{direction}_indptr`, `_ids`, `_counts`: the tables
+          behind `likely_next` ('next') and `likely_previous`
+          ('previous'); the neighbors of word ID `w` are
+          `ids[indptr[w]:indptr[w+1]]`, most likely first
+        - `version`: the version of this layout
+
+        Parameters
+        ----------
+        path: string
+            File (`format='npz'`) or directory (`format='npy'`) to write
+        n: int or list of int
+            Sizes of the n-grams to export
+        top, min_count, approx, memory_budget, workers:
+            Select and count the n-grams as in `ngrams`
+        bigrams: boolean
+            Also export the bigram tables
+        format: string
+            'npz' for a single uncompressed `.npz` file, or 'npy' for a
+            directory of `.npy` files that can be memory-mapped
 
         Examples
         --------
-        >>> analyzer = PGalyzer('pg_start_only.txt', clean_pg=True)
-        "produced by roger squires a study in scarlet by a conan doyle 1"
+        >>> analyzer = PGalyzer('1342.txt', clean_pg=True)
+        >>> analyzer.export('1342.npz', n=[1, 2], bigrams=True)
+        >>> arrays = np.load('1342.npz')
+        >>> arrays['ngrams_1_counts'][:5]
+        array([ 282,  407, 2189,  184,  783])
+        """
+        if format not in EXPORT_FORMATS:
+            raise ValueError('format must be one of {}.'.format(
+                ', '.join(EXPORT_FORMATS)))
+        sizes = _ngram_sizes(n)
+        words, arrays = self._export_arrays(sizes, top, min_count, approx,
+                                            memory_budget, workers)
+        if bigrams:
+            self._build_bigrams(workers)
+            for direction, (indptr, ids, counts) in self._bigrams.items():
+                # Words only found by `approx` have no neighbors
+                indptr = np.pad(indptr, (0, len(words) + 1 - len(indptr)),
+                                mode='edge')
+                arrays['bigrams_{}_indptr'.format(direction)] = indptr
+                arrays['bigrams_{}_ids'.format(direction)] = ids
+                arrays['bigrams_{}_counts'.format(direction)] = counts
+        arrays['words_data'], arrays['words_offsets'] = _string_table(words)
+        arrays['version'] = np.array(EXPORT_VERSION)
 
-        >>> test_file = "/mnt/data/public/gutenberg/2/6/2/0/26206/26206.txt"
-        >>> analyzer = PGalyzer(test_file, True)
-        >>> analyzer.text[:200]
-        "produced by greg weeks dave lovelace stephen blundell and the online"
-        "distributed proofreading team at httpwwwpgdpnet\n_pandemic_\n_by j f"
-        "bone_\n        _generally           human beings don't do       t"
+        with self.stats.stage('export'):
+            if format == 'npz':
+                np.savez(path, **arrays)
+            else:
+                os.makedirs(path, exist_ok=True)
+                for name, arr in arrays.items():
+                    np.save(join(path, name + '.npy'), arr)
+                # Drop the tables of an earlier export to the same place
+                for name in os.listdir(path):
+                    if (name.startswith(('ngrams_', 'bigrams_'))
+                            and name.endswith('.npy')
+                            and name[:-len('.npy')] not in arrays):
+                        os.remove(join(path, name))
 
+    def ngram_frame(self, n=1, top=None, min_count=None, approx=False,
+                    memory_budget=MEMORY_BUDGET):
         """
-        # Load the file contents
-        if type(text_file) == str:
-            with open(text_file, 'r') as f:
-                file = f.read()
-        else:
-            file = text_file[0] + text_file[1].read().replace('\r', ' ')
+        Return the n-gram counts of size `n` as a pandas DataFrame.
 
-        if clean_pg:
-            # Convert to lower case
-            # Divide according to paragraphs
-            file = file.lower().split('\n\n')
+        The DataFrame has one categorical column per word of the
+        n-gram, `word1` to `word{n}`, whose categories are the words of
+        the text, and a `count` column.  Rows are in order of first
+        appearance, or in output order if `top`, `min_count` or
+        `approx` is given (see `ngrams`).  No n-gram string is built.
 
-            # Remove header and footer
-            head = '*** start of this project gutenberg ebook'
-            foot = '*** end of this project gutenberg ebook'
+        Examples
+        --------
+        >>> frame = PGalyzer('1342.txt', clean_pg=True).ngram_frame(2)
+        >>> frame.nlargest(2, 'count')
+              word1 word2  count
+        77       of   the    464
+        1210     to    be    436
+        """
+        words, arrays = self._export_arrays([n], top, min_count, approx,
+                                            memory_budget)
+        ids = arrays['ngrams_{}_ids'.format(n)]
+        categories = pd.Index(words)
+        frame = pd.DataFrame({
+            'word{}'.format(j + 1): pd.Categorical.from_codes(ids[:, j],
+                                                              categories)
+            for j in range(ids.shape[1])})
+        frame['count'] = arrays['ngrams_{}_counts'.format(n)]
+        return frame
 
-            for ix, text in enumerate(file):
-                if text.startswith(head):
-                    del file[:ix+1]
-                    break
+    def cooccurrence(self, window=2):
+        """
+        Return the sparse matrix of how often each word is followed by
+        each other word within `window` words, in the same paragraph.
 
-            for ix, text in enumerate(file[::-1]):
-                if text.startswith(foot):
-                    del file[-(ix+1):]
-                    break
+        The pairs at each distance are counted on the word IDs, then
+        summed into a CSR matrix; no per-word dictionary is built.  The
+        matrix is built once per `window`.
 
-            # Remove punctuation and empty strings
-            punct = '|;,.:?!"()[]{}/\\-+'
-            file = list(filter(('').__ne__, file))
+        Parameters
+        ----------
+        window: int
+            Largest distance between the two words of a pair; 1 counts
+            adjacent words only
 
-            for ix, text in enumerate(file):
-                text = text.strip('\n').replace('\n', ' ')
-                for p in punct:
-                    text = text.replace(p, '')
-                file[ix] = text + '\n'
+        Returns
+        -------
+        matrix: Cooccurrence
+            Counts of the ordered pairs of words, by word ID
 
-            self.text = ''.join(file).strip()
-        else:
-            self.text = file
+        Examples
+        --------
+        >>> analyzer = PGalyzer('1342.txt', clean_pg=True)
+        >>> analyzer.cooccurrence(1).get('of', 'the')
+        464
+        """
+        if window < 1:
+            raise ValueError('window must be at least 1.')
+        self._tokenize()
+        if window in self._cooccurrences:
+            return self._cooccurrences[window]
+
+        with self.stats.stage('cooccurrence'):
+            tokens = self._tokens
+            size = len(self._words)
+            room = self._paragraph_room()
+            keys, counts = [], []
+            for distance in range(1, window + 1):
+                starts = np.flatnonzero(room > distance)
+                pairs, found = np.unique(
+                    tokens[starts].astype(np.int64) * size
+                    + tokens[starts + distance], return_counts=True)
+                keys.append(pairs)
+                counts.append(found)
+                self.stats.add('cooccurrence', tokens=len(starts))
+
+            # Add up the counts of each pair over the distances
+            keys, inverse = np.unique(np.concatenate(keys),
+                                      return_inverse=True)
+            counts = np.bincount(inverse, weights=np.concatenate(counts),
+                                 minlength=len(keys)).astype(np.int64)
+            rows, columns = np.divmod(keys, size)
+            indptr = np.zeros(size + 1, dtype=np.int64)
+            np.cumsum(np.bincount(rows, minlength=size), out=indptr[1:])
+            self._cooccurrences[window] = Cooccurrence(
+                list(self._words), window, indptr,
+                columns.astype(np.int32), counts)
+        return self._cooccurrences[window]
 
-    def ngrams(self, n=1):
+    def collocations(self, window=2, measure='pmi', top=None,
+                     min_count=None):
         """
-        Count the number of times a group of words (defined by n)
-        are found within a file.
+        Rank the pairs of words of `cooccurrence(window)` by a
+        collocation measure.
+
+        The pointwise mutual information, Dunning's log-likelihood and
+        the t-score of every pair are computed at once on the whole
+        matrix (see `Cooccurrence.scores`).  Pairs are sorted by
+        decreasing `measure`, then by decreasing count, then
+        alphabetically.
 
         Parameters
         ----------
-        n: int
-            Number of (consecutive) words to group together.
+        window: int
+            Largest distance between the two words of a pair
+        measure: str
+            Measure to rank by: 'pmi', 'log_likelihood' or 't_score'
+        top: int
+            Keep only the `top` first pairs (default: all)
+        min_count: int
+            Keep only pairs found at least `min_count` times; PMI
+            favors rare pairs, so a few are usually required
 
         Returns
         -------
-        ngrams: dict
-            Count of n-gram repetitions
+        frame: pandas.DataFrame
+            Categorical `word1` and `word2` columns, as in
+            `ngram_frame`, then `count`, `pmi`, `log_likelihood` and
+            `t_score`
 
+        Examples
+        --------
+        >>> analyzer = PGalyzer('1342.txt', clean_pg=True)
+        >>> frame = analyzer.collocations(5, 'log_likelihood', top=10)
+        >>> list(frame.columns)
+        ['word1', 'word2', 'count', 'pmi', 'log_likelihood', 't_score']
         """
-        paragraphs = self.text.split('\n')
-        ngrams = []
-
-        for p in paragraphs:
-            words_all = p.split()
-            for i in range(len(words_all)):
-                if i+n > len(words_all):
-                    break
-                else:
-                    ngrams.append(' '.join(words_all[i:i+n]))
+        if measure not in COLLOCATION_MEASURES:
+            raise ValueError('measure must be one of {}.'.format(
+                ', '.join(COLLOCATION_MEASURES)))
+        matrix = self.cooccurrence(window)
+        with self.stats.stage('collocations'):
+            scores = matrix.scores()
+            rows, columns = matrix.rows(), matrix.indices
+            index = np.arange(len(matrix.data))
+            if min_count is not None:
+                index = index[matrix.data >= min_count]
+            rank = self._alphabetical_rank()
+            index = index[np.lexsort((rank[columns[index]],
+                                      rank[rows[index]],
+                                      -matrix.data[index],
+                                      -scores[measure][index]))]
+            if top is not None:
+                index = index[:max(top, 0)]
 
-        return Counter(ngrams)
+            categories = pd.Index(matrix.words)
+            frame = pd.DataFrame({
+                'word1': pd.Categorical.from_codes(rows[index], categories),
+                'word2': pd.Categorical.from_codes(columns[index],
+                                                   categories),
+                'count': matrix.data[index]})
+            for name in COLLOCATION_MEASURES:
+                frame[name] = scores[name][index]
+        return frame
 
-    def word_count(self):
+    def _export_arrays(self, sizes, top, min_count, approx, memory_budget,
+                       workers=1):
         """
-        Return the count of each word (characters bounded by whitespace).
+        Return the vocabulary and the `ngrams_{k}_ids` and
+        `ngrams_{k}_counts` arrays of `export` for the sizes in `sizes`.
         """
-        return Counter(self.text.split())
+        arrays = {}
+        if approx:
+            ranked = {k: self._ranked_ngrams(k, top, min_count, True,
+                                             memory_budget)
+                      for k in sizes}
+            # Words of the kept n-grams, after those already numbered
+            vocab = dict(getattr(self, '_vocab', {}))
+            for k, rows in ranked.items():
+                words = [w for ngram, _ in rows for w in ngram.split(' ')]
+                ids = np.fromiter((vocab.setdefault(w, len(vocab))
+                                   for w in words),
+                                  dtype=np.int32, count=len(words))
+                arrays['ngrams_{}_ids'.format(k)] = ids.reshape(-1, k)
+                arrays['ngrams_{}_counts'.format(k)] = np.array(
+                    [count for _, count in rows], dtype=np.int64)
+            return list(vocab), arrays
 
-    def concordance(self, word, neighborhood_size=10):
+        table = self._count_ngrams(sizes, workers)
+        for k in sizes:
+            ids, counts = table[k]
+            if top is not None or min_count is not None:
+                index = self._rank_index(ids, counts, top, min_count)[0]
+                ids, counts = ids[index], counts[index]
+            arrays['ngrams_{}_ids'.format(k)] = ids
+            arrays['ngrams_{}_counts'.format(k)] = counts
+        return self._words, arrays
+
+    def concordance(self, word, neighborhood_size=10, prefix=False,
+                    limit=None, offset=0):
         """
         Takes in a `word` and the optional argument `neighborhood_size`
         and returns a list of tuples with format `(string_before,
@@ -137,20 +3201,40 @@ class PGalyzer:
         starting from the word and counting forward
         by the `neighborhood_size`.
 
+        `word` may also be a phrase of several words separated by
+        whitespace, which is looked up in a suffix array of the text
+        (see `phrase_count`); the context is then taken before its
+        first word and after its last one, within its paragraph.
+
         Parameters
         ----------
         text: str
             Text file to search word in
-        word: str
-            Word to search for
+        word: str or list of str
+            Word or phrase to search for.  If a list is given, every
+            word is looked up in one pass.
         neighborhood_size : int
             Default: 10
             Number of words to count backwards/forward from the `word
+        prefix : bool
+            Default: False
+            Also find the words, or the phrases ending with words,
+            that start with the last word of `word`
+        limit : int
+            Default: None
+            Largest number of occurrences to return, or None for all
+        offset : int
+            Default: 0
+            Number of occurrences to skip first, in order of
+            appearance; with `limit`, the concordance is returned one
+            page at a time
 
         Returns
         -------
-        concordance: list of tuples
-            In the format of `(string_before, string_after)`
+        concordance: Concordance
+            Sequence of tuples in the format of `(string_before,
+            string_after)`, rendered only when accessed, or a dict
+            mapping each word to its sequence if `word` is a list
 
         Example
         -------
@@ -164,35 +3248,49 @@ class PGalyzer:
                        ('eager children cry why', 'loves the lamb you')]
         """
 
-        # Setting things up
-        concordance = []
-        text_split = self.text.split('\n')
-        for line in text_split:
-            items = line.split()
+        if not isinstance(word, str):
+            return {w: self.concordance(w, neighborhood_size, prefix,
+                                        limit, offset)
+                    for w in word}
+        if (limit is not None and limit < 0) or offset < 0:
+            raise ValueError('limit and offset must not be negative.')
+        page = slice(offset, None if limit is None else offset + limit)
+        if prefix or len(word.split()) > 1:
+            return self._phrase_concordance(word, neighborhood_size, prefix,
+                                            page)
 
-            # Figuring out the indices of each word occurence
-            indices = [i for i, s in enumerate(items) if word == s]
-
-            # Setting up the backward and forward index for neighboring words
-            for i in indices:
-                if i - neighborhood_size < 0:
-                    backward_index = 0
-                else:
-                    backward_index = i - neighborhood_size
+        # Setting things up
+        self._build_positions()
+        if word not in self._vocab:
+            empty = np.zeros(0, dtype=np.int64)
+            return Concordance(self._words, self._tokens, empty, empty,
+                               empty, empty)
 
-                forward_index = i + neighborhood_size + 1
+        # Looking up the indices of each word occurence
+        indptr, positions, paragraphs = self._positions
+        start, end = indptr[self._vocab[word]:self._vocab[word]+2].tolist()
+        hits = range(start, end)[page]
+        start, end = hits.start, hits.stop
+        indices = positions[start:end]
+        starts = self._offsets[paragraphs[start:end]]
+        ends = self._offsets[paragraphs[start:end] + 1]
 
-                # Appending 'string_before' and 'string_after' as a tuple
-                string_before = (' ').join(items[backward_index:i])
-                string_after = (' ').join(items[i+1:forward_index])
-                concordance.append((string_before, string_after))
+        # Setting up the backward and forward index for neighboring words,
+        # clipped to the paragraph of the occurence
+        backward = np.maximum(indices - neighborhood_size, starts)
+        forward = np.minimum(indices + neighborhood_size + 1, ends)
 
-        return concordance
+        # 'string_before' and 'string_after' are rendered when accessed
+        return Concordance(self._words, self._tokens, backward, indices,
+                           indices + 1, forward)
 
-    def display_concordance(self, word, neighborhood_size=10):
+    def display_concordance(self, word, neighborhood_size=10, prefix=False,
+                            limit=None, offset=0, stream=False,
+                            markup=('<b>', '</b>')):
         """
-        Accepts the same arguments as `concordance`: `word`
-        and `neighborhood_size` and then displays the aligned
+        Accepts the same arguments as `concordance`: `word`,
+        `neighborhood_size`, `prefix`, `limit` and `offset`, and then
+        displays the aligned
         `word`s flanked by their corresponding `string_before`s
         and `string_after`s
 
@@ -200,11 +3298,30 @@ class PGalyzer:
         ----------
         text: str
             Text file to search word in
-        word: str
-            Word to search for
+        word: str or list of str
+            Word or phrase to search for, or a list of them to search
+            for in one pass
         neighborhood_size : int
             Default: 10
             Number of words to count backwards/forward from the `word
+        prefix : bool
+            Default: False
+            Also find the words, or the phrases ending with words,
+            that start with the last word of `word`; each line shows
+            the words found
+        limit : int
+            Default: None
+            Largest number of lines to display, or None for all
+        offset : int
+            Default: 0
+            Number of occurrences to skip first
+        stream : bool
+            Default: False
+            Return a generator of the lines, rendered one at a time
+            and without the `<pre>` tags, instead of one string
+        markup : tuple of str
+            Default: ('<b>', '</b>')
+            Strings written before and after each `word`
 
         Returns
         -------
@@ -213,6 +3330,10 @@ class PGalyzer:
             `string_before1` <b>word</b> `string_after1`
             `string_before2` <b>word</b> `string_after2`
             `string_before3` <b>word</b> `string_after3`
+            It is empty if `word` is not found.  The alignment width
+            is that of the lines displayed, and is measured from word
+            lengths before any line is rendered.  If `word` is a list,
+            a dict mapping each word to its display.
 
         Example
         -------
@@ -235,25 +3356,25 @@ class PGalyzer:
         """
 
         # Being efficient and utilizing the concordance method
-        concordance = self.concordance(word=word,
-                                       neighborhood_size=neighborhood_size)
-
-        # Calculating number of spaces to append for alignment
-        display = []
-        space = max([len(l) for l in list(zip(*concordance))[0]])
-
-        # Setting up the lines of display
-        for element in concordance:
-            display.append(' '*(space - len(element[0])) + element[0]
-                           + ' ' + '<b>' + word + '</b>' + ' ' + element[1])
+        if not isinstance(word, str):
+            return {w: self.display_concordance(w, neighborhood_size, prefix,
+                                                limit, offset, stream,
+                                                markup)
+                    for w in word}
+        concordance = self.concordance(word, neighborhood_size, prefix,
+                                       limit, offset)
+        self._build_chars()
+        concordance.chars = self._chars
+        lines = concordance.lines(markup)
+        if stream:
+            return lines
 
         # Finalizing display
-        display[0] = '<pre>' + display[0]
-        display[len(display)-1] = display[len(display)-1] + '</pre>'
-        display = ('\n').join(display)
-        return display
+        display = '\n'.join(lines)
+        return '<pre>' + display + '</pre>' if display else ''
 
-    def likely_next(self, word, n=5):
+    def likely_next(self, word, n=5, workers=1, order=TRIE_ORDER,
+                    backoff=False):
         """
         Returns the most likely next words in a text
 
@@ -265,17 +3386,31 @@ class PGalyzer:
         self : str
             Pertaining to init function on where to get text
             Contains text to train at.
-        word : string
-            Find the most likely next words of `word`
+        word : string or list of strings
+            Find the most likely next words of `word`, or of each
+            word of a list in one pass.  `word` may also be a context
+            of several words, e.g. 'out of the', which is looked up in
+            a trie of n-gram counts built once per `order`.
         n : int
             The number words to show (default is 5)
-
+        workers : int
+            Number of processes building the bigram index of a large
+            text, as in `ngrams` (default is 1)
+        order : int
+            Longest n-grams of the trie; only the last `order - 1`
+            words of a context are used (default is 4)
+        backoff : bool
+            If True, a context never found with a next word is
+            shortened, one word at a time, down to the most frequent
+            words of the text, instead of raising a KeyError
 
         Returns
         -------
         A list of tuples
             This is a list of the `n` most likely next words along with their
-            frequency as a tuple, sorted by decreasing likelihood.
+            frequency as a tuple, sorted by decreasing likelihood.  If
+            `word` is a list, a dict mapping each word to its list,
+            which is empty for words that are never followed by another.
 
         Example
         -------
@@ -286,21 +3421,10 @@ class PGalyzer:
 
         [('the', 30), ('his', 5), ('it', 5), ('that', 4), ("thurston's", 4)])
         """
-        text_split = self.text.split('\n')
-        count_dict = {}
-        new_dict = defaultdict(list)
-        for line in text_split:
-            words = line.split()
-            for index in range(len(words)-1):
-                new_dict[words[index]] += [words[(index + 1)]]
-                # next word
-        for key in new_dict.keys():
-            count_dict[key] = sorted(Counter(new_dict[key]).most_common(),
-                                     key=lambda i: (-i[1], i[0]))
+        return self._likely('next', word, n, workers, order, backoff)
 
-        return (count_dict[word])[:n]
-
-    def likely_previous(self, word, n=5):
+    def likely_previous(self, word, n=5, workers=1, order=TRIE_ORDER,
+                        backoff=False):
         """
         Returns the most likely previous words in a text
 
@@ -312,16 +3436,31 @@ class PGalyzer:
         self : str
             Pertaining to init function on where to get text
             Contains text to train at.
-        word : string
-            Find the most likely previous words of `word`
+        word : string or list of strings
+            Find the most likely previous words of `word`, or of each
+            word of a list in one pass.  `word` may also be a context
+            of several words, e.g. 'out of the', which is looked up in
+            a trie of n-gram counts built once per `order`.
         n : int
             The number words to show (default is 5)
+        workers : int
+            Number of processes building the bigram index of a large
+            text, as in `ngrams` (default is 1)
+        order : int
+            Longest n-grams of the trie; only the first `order - 1`
+            words of a context are used (default is 4)
+        backoff : bool
+            If True, a context never found with a previous word is
+            shortened, one word at a time, down to the most frequent
+            words of the text, instead of raising a KeyError
 
         Returns
         -------
         A list of tuples
             This is a list of the `n` most likely previous words along
             with their frequency as a tuple, sorted by decreasing likelihood.
+            If `word` is a list, a dict mapping each word to its list,
+            which is empty for words that are never preceded by another.
 
         Example
         -------
@@ -335,21 +3474,516 @@ class PGalyzer:
          ('died', 2)]
 
         """
-        text_split = self.text.split('\n')
-        new_dict = defaultdict(list)
-        count_dict = {}
-        for line in text_split:
-            words = line.split()
-            for index in range(1, len(words)):
-                new_dict[words[index]] += [words[(index - 1)]]
-                # previous word
-        for key in new_dict.keys():
-            count_dict[key] = sorted(Counter(new_dict[key]).most_common(),
-                                     key=lambda i: (-i[1], i[0]))
+        return self._likely('previous', word, n, workers, order, backoff)
+
+    def _build_trie(self, direction, order, workers=1):
+        """
+        Build (once per `direction` and `order`) the n-gram trie used
+        by `likely_next` and `likely_previous` for contexts of several
+        words, from the counts of `_count_ngrams`.  See `_NgramTrie`.
+        """
+        if self.text is not None:
+            self._tokenize(workers)
+        key = (direction, order)
+        if key not in self._tries:
+            table = self._count_ngrams(range(1, order + 1), workers)
+            with self.stats.stage('trie'):
+                self._tries[key] = _NgramTrie(
+                    table, len(self._words), self._alphabetical_rank(),
+                    reverse=direction == 'previous')
+        return self._tries[key]
+
+    def _likely_context(self, direction, words, n, order, backoff, workers):
+        """
+        Look up the `n` most likely `direction` words of the context
+        `words`, a list of several words, in the n-gram trie.
+
+        Only the last `order - 1` words (the first ones for
+        'previous') are used.  With `backoff`, a context that is never
+        followed by a word is shortened, one word at a time from its
+        far end, down to the empty context of the most frequent words.
+        Otherwise, it raises a KeyError.
+        """
+        trie = self._build_trie(direction, order, workers)
+        if direction == 'previous':
+            words = words[::-1]
+        words = words[len(words) - min(len(words), order - 1):]
+
+        for start in range(len(words) + 1):
+            context = words[start:]
+            if any(w not in self._vocab for w in context):
+                node = None
+            else:
+                node = trie.find([self._vocab[w] for w in context])
+            if node is not None:
+                ids, counts = trie.top(node, len(context), n)
+                if ids or n == 0:
+                    return list(zip(map(self._words.__getitem__, ids),
+                                    counts))
+            if not backoff:
+                raise KeyError(' '.join(words[::-1] if direction == 'previous'
+                                        else words))
+        return []
+
+    def _likely(self, direction, word, n, workers=1, order=TRIE_ORDER,
+                backoff=False):
+        """
+        Look up the `n` most likely `direction` ('next' or 'previous')
+        words of `word` in the bigram index, or of a context of several
+        words in the n-gram trie (see `_likely_context`).
+
+        Raises a KeyError if `word` is never followed (or preceded) by
+        another word in a paragraph, unless `word` is a list of words.
+        """
+        if not isinstance(word, str):
+            likely = {}
+            for w in word:
+                try:
+                    likely[w] = self._likely(direction, w, n, workers,
+                                             order, backoff)
+                except KeyError:
+                    likely[w] = []
+            return likely
+
+        words = word.split()
+        if len(words) > 1 or backoff:
+            return self._likely_context(direction, words, n, order, backoff,
+                                        workers)
+
+        self._build_bigrams(workers)
+        indptr, ids, counts = self._bigrams[direction]
+        if word not in self._vocab:
+            raise KeyError(word)
+        start, end = indptr[self._vocab[word]:self._vocab[word]+2].tolist()
+        if start == end:
+            raise KeyError(word)
+
+        # Same semantics as slicing the full list with [:n]
+        end = min(end, start + n) if n >= 0 else max(start, end + n)
+        return list(zip(map(self._words.__getitem__, ids[start:end].tolist()),
+                        counts[start:end].tolist()))
+
+
+# Server Section
+SERVER_ADDRESS = 'localhost:8765'
+SERVER_METHODS = {'ngrams', 'word_count', 'concordance',
+                  'display_concordance', 'phrase_count', 'likely_next',
+                  'likely_previous'}
+
+
+def _parse_address(address):
+    """
+    Return `(host, port)` for a `host:port` or `port` address, or
+    `(path, None)` for a Unix socket path (anything with a `/`).
+    """
+    if '/' in address:
+        return address, None
+    host, _, port = address.rpartition(':')
+    return host or 'localhost', int(port)
+
+
+class _AnalyzerPool:
+    """
+    PGalyzer objects kept loaded by the server.
+
+    Analyzers are keyed by file, modification time and `clean_pg`, so
+    a file that changes is loaded again.  When their estimated memory
+    use goes above `max_bytes`, the least recently used analyzers are
+    dropped.  Queries are answered one at a time, and only for files
+    under the directory `root`.
+    """
+    def __init__(self, max_bytes, cache=None, root='.'):
+        self.max_bytes = max_bytes
+        self.cache = cache or {}
+        self.root = os.path.realpath(root)
+        self.analyzers = OrderedDict()
+        self.usage = {}
+
+    def get(self, path, clean_pg):
+        """Return the analyzer of `path`, loading it if needed."""
+        path = os.path.realpath(path)
+        if os.path.commonpath([self.root, path]) != self.root:
+            raise PermissionError('{} is not under the served directory '
+                                  '{}.'.format(path, self.root))
+        stat = os.stat(path)
+        key = (path, stat.st_mtime_ns, stat.st_size, bool(clean_pg))
+        if key not in self.analyzers:
+            self.analyzers[key] = PGalyzer(path, clean_pg, **self.cache)
+        self.analyzers.move_to_end(key)
+        return key, self.analyzers[key]
+
+    def evict(self, keep):
+        """Drop analyzers, oldest first, until under `max_bytes`."""
+        for key in list(self.analyzers):
+            if sum(self.usage.values()) <= self.max_bytes:
+                break
+            if key != keep:
+                del self.analyzers[key]
+                self.usage.pop(key, None)
+
+    def answer(self, line):
+        """
+        Answer one JSON request line with one JSON response line.
+
+        A request is an object with the `file` to analyze, `clean_pg`,
+        the PGalyzer `method` to call and its `args` and `kwargs`.  The
+        response is `{"result": ...}` or `{"error": ..., "type": ...}`.
+        """
+        try:
+            request = json.loads(line)
+            if request['method'] not in SERVER_METHODS:
+                raise ValueError('Unknown method: {}'.format(
+                    request['method']))
+            key, analyzer = self.get(request['file'],
+                                     request.get('clean_pg', False))
+            method = getattr(analyzer, request['method'])
+            result = method(*request.get('args', []),
+                            **request.get('kwargs', {}))
+            self.usage[key] = analyzer._memory_usage()
+            self.evict(key)
+            response = {'result': result}
+        except Exception as e:
+            # str() of a KeyError quotes its key, which the client would
+            # quote again
+            message = e.args[0] if isinstance(e, KeyError) and e.args \
+                else str(e)
+            response = {'error': message, 'type': type(e).__name__}
+        # Concordances are sent as lists of tuples
+        return (json.dumps(response, default=list) + '\n').encode()
+
+
+async def _serve(address, pool):
+    """Answer JSON-line requests on `address` until cancelled."""
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=1)
+
+    async def handle(reader, writer):
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            response = await loop.run_in_executor(executor, pool.answer,
+                                                  line)
+            writer.write(response)
+            await writer.drain()
+        writer.close()
+
+    host, port = _parse_address(address)
+    if port is None:
+        server = await asyncio.start_unix_server(handle, host)
+    else:
+        server = await asyncio.start_server(handle, host, port)
+    async with server:
+        await server.serve_forever()
+
+
+class _RemoteAnalyzer:
+    """
+    Stand-in for a PGalyzer object that forwards method calls to a
+    server started with the `serve` command.
+    """
+    def __init__(self, address, text_file, clean_pg, profile=False):
+        self.address = address
+        self.text_file = os.path.abspath(text_file)
+        self.clean_pg = clean_pg
+        self.stats = Stats(bool(profile), profile == 'memory')
+
+    def __getattr__(self, method):
+        def call(*args, **kwargs):
+            with self.stats.stage('server'):
+                return self._call(method, args, kwargs)
+        return call
+
+    def _call(self, method, args, kwargs):
+        host, port = _parse_address(self.address)
+        if port is None:
+            sock = socket.socket(socket.AF_UNIX)
+            sock.connect(host)
+        else:
+            sock = socket.create_connection((host, port))
+        request = {'file': self.text_file, 'clean_pg': self.clean_pg,
+                   'method': method, 'args': args, 'kwargs': kwargs}
+        with sock, sock.makefile('rwb') as f:
+            f.write((json.dumps(request) + '\n').encode())
+            f.flush()
+            response = json.loads(f.readline())
+
+        if 'error' in response:
+            error = getattr(builtins, response['type'], None)
+            if not (isinstance(error, type)
+                    and issubclass(error, Exception)):
+                error = RuntimeError
+            raise error(response['error'])
+        return response['result']
 
-        return (count_dict[word])[:n]
 
 # CLI Section
+def _echo_lines(lines):
+    """
+    Write `lines` to standard output in batches.
+
+    The output is the same as `click.echo('\\n'.join(lines))` but the
+    lines are never all joined into one large string.
+    """
+    lines = iter(lines)
+    empty = True
+    for batch in iter(lambda: list(islice(lines, 4096)), []):
+        click.echo('\n'.join(batch))
+        empty = False
+    if empty:
+        click.echo('')
+
+
+def _rank_items(counts):
+    """
+    Return the `(ngram, count)` items of `counts`, a dict in order of
+    first appearance or already ranked, in the output order of
+    `PGalyzer._rank`: by decreasing count, then alphabetically, then in
+    dict order.
+    """
+    return sorted(counts.items(), key=lambda item: (-item[1],
+                                                    item[0].lower()))
+
+
+def _expand_paths(patterns):
+    """
+    Expand file arguments into a list of filepaths.
+
+    Directories are searched recursively for `.txt` files and other
+    arguments that are not files are treated as glob patterns.  Each
+    expansion is sorted so that the order of the files is always the
+    same.
+    """
+    paths = []
+    for pattern in patterns:
+        if isfile(pattern):
+            matches = [pattern]
+        elif isdir(pattern):
+            matches = sorted(glob(join(glob_escape(pattern), '**', '*.txt'),
+                                  recursive=True))
+        else:
+            matches = sorted(filter(isfile, glob(pattern, recursive=True)))
+
+        # Echo error if exists = False
+        if not matches:
+            raise click.ClickException(
+                "Invalid value for file path. "
+                "Path {} does not exist.".format(pattern)
+            )
+        paths.extend(matches)
+    return paths
+
+
+def _cache_options(command):
+    """
+    Add the on-disk cache options to a CLI command.
+
+    The options reach the command as a single `cache` dict of keyword
+    arguments for PGalyzer.
+    """
+    @wraps(command)
+    def wrapper(*args, cache, cache_dir, cache_size, **kwargs):
+        if cache or cache_dir is not None:
+            cache = dict(cache_dir=cache_dir or CACHE_DIR,
+                         cache_size=cache_size << 20)
+        else:
+            cache = {}
+        return command(*args, cache=cache, **kwargs)
+
+    wrapper = click.option('--cache-size', default=CACHE_SIZE >> 20,
+                           type=click.INT,
+                           help='Maximum size of the cache in MB.')(wrapper)
+    wrapper = click.option('--cache-dir', default=None,
+                           type=click.Path(file_okay=False),
+                           help='Directory of the cache; implies --cache.'
+                           )(wrapper)
+    wrapper = click.option('--cache', is_flag=True,
+                           help='Reuse analyses of the file from an '
+                                'on-disk cache.')(wrapper)
+    return wrapper
+
+
+def _approx_options(command):
+    """
+    Add the approximate counting options to a CLI command.
+
+    The options reach the command as a single `approx` dict of keyword
+    arguments for `PGalyzer.ngrams` and `PGalyzer.from_corpus`.
+    """
+    @wraps(command)
+    def wrapper(*args, approx, memory_budget, **kwargs):
+        approx = dict(approx=approx, memory_budget=memory_budget << 20)
+        return command(*args, approx=approx, **kwargs)
+
+    wrapper = click.option('--memory-budget', default=MEMORY_BUDGET >> 20,
+                           type=click.INT,
+                           help='Memory of the approximate counts in MB.'
+                           )(wrapper)
+    wrapper = click.option('--approx', is_flag=True,
+                           help='Estimate the counts of the most frequent '
+                                'n-grams in bounded memory.')(wrapper)
+    return wrapper
+
+
+def _format_options(command):
+    """
+    Add the output format options to a CLI command.
+
+    The options reach the command as an `export` dict of keyword
+    arguments for `PGalyzer.export`, or None for tab-separated text.
+    """
+    @wraps(command)
+    def wrapper(*args, format, output, bigrams, **kwargs):
+        if format == 'tsv':
+            if output is not None or bigrams:
+                raise click.UsageError('--output and --bigrams need a '
+                                       'binary --format.')
+            return command(*args, export=None, **kwargs)
+        if output is None:
+            raise click.UsageError('--format {} needs --output.'.format(
+                format))
+        if kwargs.get('server') is not None:
+            raise click.UsageError('--format {} cannot be used with '
+                                   '--server.'.format(format))
+        export = dict(path=output, bigrams=bigrams, format=format)
+        return command(*args, export=export, **kwargs)
+
+    wrapper = click.option('--bigrams', is_flag=True,
+                           help='Also export the tables of likely-next '
+                                'and likely-previous.')(wrapper)
+    wrapper = click.option('-o', '--output', default=None,
+                           type=click.Path(),
+                           help='File or directory to export to.')(wrapper)
+    wrapper = click.option('--format', default='tsv',
+                           type=click.Choice(('tsv',) + EXPORT_FORMATS),
+                           help='Tab-separated text, or binary columns '
+                                'in a .npz file or a directory of .npy '
+                                'files.')(wrapper)
+    return wrapper
+
+
+def _profile_options(command):
+    """
+    Add the profiling options to a CLI command.
+
+    The options reach the command as a `profile` value for `PGalyzer`.
+    The command returns the object it queried, whose `stats` are then
+    written to standard error as a table or as JSON.
+    """
+    @wraps(command)
+    def wrapper(*args, profile, profile_memory, profile_format, **kwargs):
+        profile = 'memory' if profile_memory else profile
+        file = command(*args, profile=profile, **kwargs)
+        if profile and profile_format == 'json':
+            click.echo(json.dumps(file.stats.as_dict()), err=True)
+        elif profile:
+            click.echo(file.stats.report(), err=True)
+        return file
+
+    wrapper = click.option('--profile-format', default='text',
+                           type=click.Choice(['text', 'json']),
+                           help='Format of the profile.')(wrapper)
+    wrapper = click.option('--profile-memory', is_flag=True,
+                           help='Also profile the peak memory of each '
+                                'stage; implies --profile.')(wrapper)
+    wrapper = click.option('--profile', is_flag=True,
+                           help='Write the time spent in each stage to '
+                                'standard error.')(wrapper)
+    return wrapper
+
+
+_server_option = click.option(
+    '--server', default=None, metavar='ADDRESS',
+    help='Forward the query to a `serve` process at HOST:PORT or a Unix '
+         'socket path.')
+
+
+def _load(text_file, clean_pg, cache, server, profile=False):
+    """
+    Return the PGalyzer object of a CLI command, or a stand-in that
+    forwards its queries to `server`.
+    """
+    if server is None:
+        return PGalyzer(text_file, clean_pg, profile=profile, **cache)
+    if not isinstance(text_file, str):
+        raise click.ClickException("Standard input cannot be sent to a "
+                                   "server.")
+    return _RemoteAnalyzer(server, text_file, clean_pg, profile)
+
+
+_words_file_option = click.option(
+    '-f', '--words-file', default=None,
+    type=click.Path(exists=True, dir_okay=False, allow_dash=True),
+    help='File with the words or phrases to look up, one per line; `-` '
+         'reads them from standard input.')
+
+
+def _page_options(command):
+    """Add the `--limit` and `--offset` options of concordances."""
+    command = click.option('--offset', type=click.IntRange(min=0), default=0,
+                           help='Skip the first N occurrences.')(command)
+    command = click.option('--limit', type=click.IntRange(min=0),
+                           default=None,
+                           help='Output at most N occurrences.')(command)
+    return command
+
+
+def _query_lines(lines):
+    """
+    Return the queries of a words file: each non-empty line is one
+    word or phrase, with its surrounding whitespace stripped.
+    """
+    return [line.strip() for line in lines if line.strip()]
+
+
+def _query_words(word, words_file, text_file):
+    """
+    Return the words looked up by a CLI command and whether they are
+    answered as a batch, with a header line before each result.
+    """
+    words = list(word)
+    if words_file == '-':
+        if text_file == '-':
+            raise click.ClickException("Standard input cannot hold both "
+                                       "the file and the words.")
+        words.extend(_query_lines(stdin))
+    elif words_file is not None:
+        with open(words_file) as f:
+            words.extend(_query_lines(f))
+    elif not words:
+        raise click.UsageError("Missing argument 'WORD...'.")
+    return words, words_file is not None or len(words) > 1
+
+
+def _ask(file, method, words, batch, **kwargs):
+    """
+    Call the query `method` of `file` for `words` and return a dict of
+    the results keyed by word.
+
+    A single word is looked up on its own so that its errors are
+    raised as before.
+    """
+    method = getattr(file, method)
+    with file.stats.stage('query'):
+        if batch:
+            return method(words, **kwargs)
+        return {words[0]: method(words[0], **kwargs)}
+
+
+def _echo_result(word, out, batch):
+    """
+    Echo the output `out` for `word`, under a header in a batch.  `out`
+    may also be an iterable of lines, written as they are rendered by
+    `_echo_lines`.
+    """
+    if batch:
+        click.echo('==> {} <=='.format(word))
+    if isinstance(out, str):
+        click.echo(out)
+    else:
+        _echo_lines(out)
+
+
 @click.group()
 def cli():
     pass
@@ -385,27 +4019,75 @@ def main(file, clean_pg):
 @cli.command(context_settings=dict(
              ignore_unknown_options=True,
              ))
-@click.argument('file', type=click.Path(allow_dash=True))
-@click.option('-n', default=1, type=click.INT,
+@click.argument('file', nargs=-1, required=True,
+                type=click.Path(allow_dash=True))
+@click.option('-n', default=1, type=click.IntRange(min=1),
               help='Number of words in the n-gram.')
 @click.option('-c', '--clean-pg', is_flag=True,
               help='Flag for triggering file cleanup.')
-def ngrams(file, n, clean_pg):
+@click.option('--top', type=click.INT, default=None,
+              help='Output only the K most frequent n-grams.')
+@click.option('--min-count', type=click.INT, default=None,
+              help='Output only n-grams found at least C times.')
+@click.option('--sort-budget', type=click.IntRange(min=1),
+              default=SORT_BUDGET >> 20,
+              help='Memory for sorting the output in MB; larger outputs '
+                   'are sorted in runs on disk.')
+@click.option('-w', '--workers', type=click.INT, default=None,
+              help='Number of processes for several files (default: '
+                   'number of CPUs), or for one large file split at '
+                   'paragraphs (default: 1).')
+@_approx_options
+@_format_options
+@_cache_options
+@_server_option
+@_profile_options
+def ngrams(file, n, clean_pg, top, min_count, sort_budget, workers, approx,
+           export, cache, server, profile):
     """
     Retrieve the sorted ngram counts of the requested file.
 
     Create a PGalyzer object using the passed filename.
     Count the n-grams based on the input number, and sort them
     by count and alphabetically (in that order of precedence).
+    If several files, directories or glob patterns are passed,
+    the counts of all the files are merged.
 
     Parameters
     ----------
-    file: string
-        Filepath
+    file: tuple of string
+        Filepaths, directories or glob patterns
     n: int
         Number of words in each n-gram; default=1
     clean_pg: bool
         Flag for cleaning the parsed file; default=False
+    top: int
+        Number of n-grams to output; default=all
+    min_count: int
+        Minimum count of the n-grams to output; default=1
+    sort_budget: int
+        Memory for sorting the output, in MB; a larger output is
+        sorted in runs on disk and merged; default=256
+    workers: int
+        Number of processes for several files, or for a single file
+        of at least `SHARD_SIZE` characters per process, which is
+        split at paragraphs; default=number of CPUs for several
+        files and 1 for a single file
+    approx: dict
+        Approximate counting settings from `--approx` and
+        `--memory-budget`
+    export: dict
+        Binary export settings from `--format`, `--output` and
+        `--bigrams`, or None to echo tab-separated text
+    cache: dict
+        On-disk cache settings from `--cache`, `--cache-dir` and
+        `--cache-size`
+    server: str
+        Address of a `serve` process to forward the query to
+    profile: bool or str
+        Profiling setting from `--profile` and `--profile-memory`;
+        the stages are written to standard error as set by
+        `--profile-format`
 
     Returns
     -------
@@ -428,7 +4110,7 @@ def ngrams(file, n, clean_pg):
     "I\t32\nby\t32\nher\t31\nShe\t31\nbut\t30\ndo\t30\n...'
 
     """
-    if file == '-':
+    if file == ('-',):
         for line in stdin:
             if 'Project Gutenberg' not in line:
                 raise click.ClickException("The file or content is not "
@@ -436,41 +4118,109 @@ def ngrams(file, n, clean_pg):
                                            "content file.")
             break
         file = (line, stdin)
+        if server is None:
+            # Count the stream as it is read
+            file = PGalyzer.from_stream(file, clean_pg, n=n,
+                                        profile=profile, **approx)
+        else:
+            file = _load(file, clean_pg, cache, server, profile)
+    elif len(file) == 1 and isfile(file[0]):
+        file = _load(file[0], clean_pg, cache, server, profile)
     else:
-        # Echo error if exists = False
-        if not exists(file):
-            raise click.ClickException(
-                "Invalid value for file path. "
-                "Path {} does not exist.".format(file)
-            )
+        # Several files, directories or globs: merge their counts
+        file = PGalyzer.from_corpus(_expand_paths(file), clean_pg,
+                                    n=n, workers=workers, profile=profile,
+                                    **cache, **approx)
+    # One file is only split among processes when asked to
+    if workers is None:
+        workers = 1
 
-    file = PGalyzer(file, clean_pg)
-    ngrams = file.ngrams(n)
-    ngrams = sorted([x for x in ngrams.most_common()],
-                    key=lambda x: (-x[1], x[0].lower()))
-    ngrams = [x + '\t' + str(y) for x, y in ngrams]
-    click.echo('\n'.join(ngrams))
+    if export is not None:
+        file.export(n=n, top=top, min_count=min_count, workers=workers,
+                    **approx, **export)
+        return file
+    with file.stats.stage('query'):
+        if isinstance(file, _RemoteAnalyzer):
+            # A server sends back the whole output at once
+            ngrams = _rank_items(file.ngrams(n, top=top,
+                                             min_count=min_count, **approx))
+        else:
+            ngrams = file._ranked_ngrams(n, top=top, min_count=min_count,
+                                         workers=workers,
+                                         sort_budget=sort_budget << 20,
+                                         **approx)
+    with file.stats.stage('echo'):
+        _echo_lines(x + '\t' + str(y) for x, y in ngrams)
+    return file
 
 
 # word_count block
 @cli.command()
-@click.argument('file', type=click.Path(allow_dash=True))
+@click.argument('file', nargs=-1, required=True,
+                type=click.Path(allow_dash=True))
 @click.option('-c', '--clean-pg', is_flag=True,
               help='Flag for triggering file cleanup.')
-def word_count(file, clean_pg):
+@click.option('--top', type=click.INT, default=None,
+              help='Output only the K most frequent words.')
+@click.option('--min-count', type=click.INT, default=None,
+              help='Output only words found at least C times.')
+@click.option('--sort-budget', type=click.IntRange(min=1),
+              default=SORT_BUDGET >> 20,
+              help='Memory for sorting the output in MB; larger outputs '
+                   'are sorted in runs on disk.')
+@click.option('-w', '--workers', type=click.INT, default=None,
+              help='Number of processes for several files (default: '
+                   'number of CPUs), or for one large file split at '
+                   'paragraphs (default: 1).')
+@_approx_options
+@_format_options
+@_cache_options
+@_server_option
+@_profile_options
+def word_count(file, clean_pg, top, min_count, sort_budget, workers, approx,
+               export, cache, server, profile):
     """
     Retrieve the sorted word counts of the requested file.
 
     Create a PGalyzer object using the passed filename.
     Count the words, and sort them by count and alphabetically
-    (in that order of precedence).
+    (in that order of precedence).  If several files, directories
+    or glob patterns are passed, the counts of all the files are
+    merged.
 
     Parameters
     ----------
-    file: string
-        Filepath
+    file: tuple of string
+        Filepaths, directories or glob patterns
     clean_pg: bool
         Flag for cleaning the parsed file; defaul=False
+    top: int
+        Number of words to output; default=all
+    min_count: int
+        Minimum count of the words to output; default=1
+    sort_budget: int
+        Memory for sorting the output, in MB; a larger output is
+        sorted in runs on disk and merged; default=256
+    workers: int
+        Number of processes for several files, or for a single file
+        of at least `SHARD_SIZE` characters per process, which is
+        split at paragraphs; default=number of CPUs for several
+        files and 1 for a single file
+    approx: dict
+        Approximate counting settings from `--approx` and
+        `--memory-budget`
+    export: dict
+        Binary export settings from `--format`, `--output` and
+        `--bigrams`, or None to echo tab-separated text
+    cache: dict
+        On-disk cache settings from `--cache`, `--cache-dir` and
+        `--cache-size`
+    server: str
+        Address of a `serve` process to forward the query to
+    profile: bool or str
+        Profiling setting from `--profile` and `--profile-memory`;
+        the stages are written to standard error as set by
+        `--profile-format`
 
     Returns
     -------
@@ -493,7 +4243,7 @@ def word_count(file, clean_pg):
     "I\t32\nby\t32\nher\t31\nShe\t31\nbut\t30\ndo\t30\n...'
 
     """
-    if file == '-':
+    if file == ('-',):
         for line in stdin:
             if 'Project Gutenberg' not in line:
                 raise click.ClickException("The file or content is not "
@@ -501,31 +4251,58 @@ def word_count(file, clean_pg):
                                            "content file.")
             break
         file = (line, stdin)
+        if server is None:
+            # Count the stream as it is read
+            file = PGalyzer.from_stream(file, clean_pg, n=1,
+                                        profile=profile, **approx)
+        else:
+            file = _load(file, clean_pg, cache, server, profile)
+    elif len(file) == 1 and isfile(file[0]):
+        file = _load(file[0], clean_pg, cache, server, profile)
     else:
-        # Echo error if exists = False
-        if not exists(file):
-            raise click.ClickException(
-                "Invalid value for file path. "
-                "Path {} does not exist.".format(file)
-            )
+        # Several files, directories or globs: merge their counts
+        file = PGalyzer.from_corpus(_expand_paths(file), clean_pg,
+                                    n=1, workers=workers, profile=profile,
+                                    **cache, **approx)
+    # One file is only split among processes when asked to
+    if workers is None:
+        workers = 1
 
-    file = PGalyzer(file, clean_pg)
-    wc = file.word_count()
-    wc = sorted([x for x in wc.most_common()],
-                key=lambda x: (-x[1], x[0].lower()))
-    wc = [x + '\t' + str(y) for x, y in wc]
-    click.echo('\n'.join(wc))
+    if export is not None:
+        file.export(n=1, top=top, min_count=min_count, workers=workers,
+                    **approx, **export)
+        return file
+    with file.stats.stage('query'):
+        if isinstance(file, _RemoteAnalyzer):
+            # A server sends back the whole output at once
+            wc = _rank_items(file.word_count(top=top, min_count=min_count,
+                                             **approx))
+        else:
+            wc = file._ranked_ngrams(1, top=top, min_count=min_count,
+                                     workers=workers,
+                                     sort_budget=sort_budget << 20, **approx)
+    with file.stats.stage('echo'):
+        _echo_lines(x + '\t' + str(y) for x, y in wc)
+    return file
 
 
 # concordance block
 @cli.command()
 @click.argument('file', type=click.Path(allow_dash=True))
-@click.argument('word')
+@click.argument('word', nargs=-1)
 @click.option('-n', '--ns', default=10, type=click.INT,
               help='Number of words to count back/forward from the `word`')
 @click.option('-c', '--clean-pg', is_flag=True,
               help='Flag for triggering file cleanup.')
-def concordance(file, word, ns, clean_pg):
+@click.option('-p', '--prefix', is_flag=True,
+              help='Also match words that start with the last word.')
+@_words_file_option
+@_page_options
+@_cache_options
+@_server_option
+@_profile_options
+def concordance(file, word, ns, clean_pg, prefix, words_file, limit, offset,
+                cache, server, profile):
     """
     Takes in a `word` and the optional argument `neighborhood_size`
     and returns a string with format `string_before\tstring_after
@@ -538,22 +4315,42 @@ def concordance(file, word, ns, clean_pg):
     ----------
     file: str
         File to search word in
-    word: str
-        Word to search for
+    word: tuple of str
+        Words, or quoted phrases of several words, to search for
     ns : int
         Default: 10
         Number of words to count backwards/forward from the `word
     clean_pg: bool
         True: clean up file
         False: do nothing
+    prefix: bool
+        Also match the words that start with the last word of `word`
+    words_file: str
+        File with more words or phrases to search for, one per line,
+        or `-` for standard input
+    limit: int
+        Output at most this many occurrences of each word
+    offset: int
+        Number of occurrences of each word to skip first
+    cache: dict
+        On-disk cache settings from `--cache`, `--cache-dir` and
+        `--cache-size`
+    server: str
+        Address of a `serve` process to forward the query to
+    profile: bool or str
+        Profiling setting from `--profile` and `--profile-memory`;
+        the stages are written to standard error as set by
+        `--profile-format`
 
     Echoes
     ----
     final: str
         A single string that contains the `string_before` and
         the `string_after` words separated by '\t', with
-        one set per line separated by '\n'
+        one set per line separated by '\n'.  When several words
+        are given, each word's lines follow a `==> word <==` line.
     """
+    targets, batch = _query_words(word, words_file, file)
     if file == '-':
         for line in stdin:
             if 'Project Gutenberg' not in line:
@@ -570,24 +4367,35 @@ def concordance(file, word, ns, clean_pg):
                 "Path {} does not exist.".format(file)
             )
 
-    file = PGalyzer(file, clean_pg)
-    concordance = file.concordance(word=word, neighborhood_size=ns)
-    final = []
-    for words in concordance:
-        final.append(words[0] + '\t' + words[1]+'\n')
-    final = ('').join(final)
-    click.echo(final)
+    file = _load(file, clean_pg, cache, server, profile)
+    concordances = _ask(file, 'concordance', targets, batch,
+                        neighborhood_size=ns, prefix=prefix, limit=limit,
+                        offset=offset)
+    with file.stats.stage('echo'):
+        for word, concordance in concordances.items():
+            # Each line ends with a newline, then a blank line follows
+            lines = (before + '\t' + after for before, after in concordance)
+            _echo_result(word, chain(lines, ['']), batch)
+    return file
 
 
 # display_concordance block
 @cli.command()
 @click.argument('file', type=click.Path(allow_dash=True))
-@click.argument('word')
+@click.argument('word', nargs=-1)
 @click.option('-n', '--ns', default=10, type=click.INT,
               help='Number of words to count back/forward from the `word`')
 @click.option('-c', '--clean-pg', is_flag=True,
               help='Flag for triggering file cleanup.')
-def display_concordance(file, word, ns, clean_pg):
+@click.option('-p', '--prefix', is_flag=True,
+              help='Also match words that start with the last word.')
+@_words_file_option
+@_page_options
+@_cache_options
+@_server_option
+@_profile_options
+def display_concordance(file, word, ns, clean_pg, prefix, words_file, limit,
+                        offset, cache, server, profile):
     """
     Takes in a `word` and the optional argument `neighborhood_size`
     and returns a string with format `string_before\tstring_after
@@ -600,22 +4408,42 @@ def display_concordance(file, word, ns, clean_pg):
     ----------
     file: str
         File to search word in
-    word: str
-        Word to search for
+    word: tuple of str
+        Words, or quoted phrases of several words, to search for
     ns : int
         Default: 10
         Number of words to count backwards/forward from the `word
     clean_pg: bool
         True: clean up file
         False: do nothing
+    prefix: bool
+        Also match the words that start with the last word of `word`
+    words_file: str
+        File with more words or phrases to search for, one per line,
+        or `-` for standard input
+    limit: int
+        Output at most this many occurrences of each word
+    offset: int
+        Number of occurrences of each word to skip first
+    cache: dict
+        On-disk cache settings from `--cache`, `--cache-dir` and
+        `--cache-size`
+    server: str
+        Address of a `serve` process to forward the query to
+    profile: bool or str
+        Profiling setting from `--profile` and `--profile-memory`;
+        the stages are written to standard error as set by
+        `--profile-format`
 
     Echoes
     ----
     display: str
         A single string that contains the context and the word
         in this format: `string_before` **word** `string_after`
-        with one set per line separated by '\n'
+        with one set per line separated by '\n'.  When several
+        words are given, each display follows a `==> word <==` line.
     """
+    targets, batch = _query_words(word, words_file, file)
     if file == '-':
         for line in stdin:
             if 'Project Gutenberg' not in line:
@@ -632,24 +4460,38 @@ def display_concordance(file, word, ns, clean_pg):
                 "Path {} does not exist.".format(file)
             )
 
-    file = PGalyzer(file, clean_pg)
-    display = file.display_concordance(word=word, neighborhood_size=ns)
-    display = display.replace('<pre>', '', 1)
-    display = display.replace('</pre>', '', 1)
-    display = display.replace('<b>', '**')
-    display = display.replace('</b>', '**')
-    click.echo(display)
+    file = _load(file, clean_pg, cache, server, profile)
+    # Lines are rendered with the CLI markup and written one at a time
+    displays = _ask(file, 'display_concordance', targets, batch,
+                    neighborhood_size=ns, prefix=prefix, limit=limit,
+                    offset=offset, stream=True, markup=('**', '**'))
+    with file.stats.stage('echo'):
+        for word, display in displays.items():
+            _echo_result(word, display, batch)
+    return file
 
 
 # Likely_next block
 @cli.command()
 @click.argument('file', type=click.Path(allow_dash=True))
-@click.argument('word')
+@click.argument('word', nargs=-1)
 @click.option('-n', default=5, type=click.INT,
               help='Number of likely next words to return.')
 @click.option('-c', '--clean-pg', is_flag=True,
               help='Flag for triggering file cleanup.')
-def likely_next(file, word, n, clean_pg):
+@click.option('-w', '--workers', type=click.INT, default=1,
+              help='Number of processes for a large file split at '
+                   'paragraphs.')
+@click.option('--order', default=TRIE_ORDER, type=click.INT,
+              help='Longest n-grams used for a context of several words.')
+@click.option('--backoff', is_flag=True,
+              help='Shorten unseen contexts instead of failing.')
+@_words_file_option
+@_cache_options
+@_server_option
+@_profile_options
+def likely_next(file, word, n, clean_pg, workers, order, backoff,
+                words_file, cache, server, profile):
     """
     Returns the most likely next words in a text
 
@@ -660,19 +4502,41 @@ def likely_next(file, word, n, clean_pg):
     ----------
     file : str
         Contains text to train at.
-    word : string
-        Find the most likely next words of `word`
+    word : tuple of strings
+        Find the most likely next words of each `word`
     n : int
         The number words to show (default is 5)
     clean_pg : bool
         This is a flag for cleaning
+    workers : int
+        Number of processes for a file of at least `SHARD_SIZE`
+        characters per process; default=1
+    order : int
+        Longest n-grams used for a context of several words, given as
+        one quoted argument; default=4
+    backoff : bool
+        Shorten contexts that are never found instead of failing
+    words_file : str
+        File with more words or contexts to look up, one per line, or
+        `-` for standard input
+    cache : dict
+        On-disk cache settings from `--cache`, `--cache-dir` and
+        `--cache-size`
+    server : str
+        Address of a `serve` process to forward the query to
+    profile : bool or str
+        Profiling setting from `--profile` and `--profile-memory`;
+        the stages are written to standard error as set by
+        `--profile-format`
 
     Echoes
     ----
     out : str
         This is a single string that contains the n most likely
         next words along with their frequency (separted by '\t')
-        sorted by decreasing likelihood (every pair is separated by '\n')
+        sorted by decreasing likelihood (every pair is separated by '\n').
+        When several words are given, each word's pairs follow a
+        `==> word <==` line.
 
     Example
     -------
@@ -682,6 +4546,7 @@ def likely_next(file, word, n, clean_pg):
 
     'the\t52\nthis\t17\na\t8\nProject\t7\nhis\t5\n\n'
     """
+    targets, batch = _query_words(word, words_file, file)
     if file == '-':
         for line in stdin:
             if 'Project Gutenberg' not in line:
@@ -698,24 +4563,40 @@ def likely_next(file, word, n, clean_pg):
                 "Path {} does not exist.".format(file)
             )
 
-    file = PGalyzer(file, clean_pg)
-    likely_next = file.likely_next(word, n)
-    out = []
-    for tup in likely_next:
-        out.append(tup[0] + '\t' + str(tup[1]) + '\n')
-    out = ('').join(out)
-    click.echo(out)
+    file = _load(file, clean_pg, cache, server, profile)
+    likely = _ask(file, 'likely_next', targets, batch, n=n,
+                  workers=workers, order=order, backoff=backoff)
+    with file.stats.stage('echo'):
+        for word, likely_next in likely.items():
+            out = []
+            for tup in likely_next:
+                out.append(tup[0] + '\t' + str(tup[1]) + '\n')
+            out = ('').join(out)
+            _echo_result(word, out, batch)
+    return file
 
 
 # likely_previous block
 @cli.command()
 @click.argument('file', type=click.Path(allow_dash=True))
-@click.argument('word')
+@click.argument('word', nargs=-1)
 @click.option('-n', default=5, type=click.INT,
               help='Number of likely previous words to return.')
 @click.option('-c', '--clean-pg', is_flag=True,
               help='Flag for triggering file cleanup.')
-def likely_previous(file, word, n, clean_pg):
+@click.option('-w', '--workers', type=click.INT, default=1,
+              help='Number of processes for a large file split at '
+                   'paragraphs.')
+@click.option('--order', default=TRIE_ORDER, type=click.INT,
+              help='Longest n-grams used for a context of several words.')
+@click.option('--backoff', is_flag=True,
+              help='Shorten unseen contexts instead of failing.')
+@_words_file_option
+@_cache_options
+@_server_option
+@_profile_options
+def likely_previous(file, word, n, clean_pg, workers, order, backoff,
+                    words_file, cache, server, profile):
     """
     Returns the most likely previous words in a text
 
@@ -726,19 +4607,41 @@ def likely_previous(file, word, n, clean_pg):
     ----------
     file : str
         Contains text to train at.
-    word : string
-        Find the most likely previous words of `word`
+    word : tuple of strings
+        Find the most likely previous words of each `word`
     n : int
         The number words to show (default is 5)
     clean_pg : bool
         This is a flag for cleaning
+    workers : int
+        Number of processes for a file of at least `SHARD_SIZE`
+        characters per process; default=1
+    order : int
+        Longest n-grams used for a context of several words, given as
+        one quoted argument; default=4
+    backoff : bool
+        Shorten contexts that are never found instead of failing
+    words_file : str
+        File with more words or contexts to look up, one per line, or
+        `-` for standard input
+    cache : dict
+        On-disk cache settings from `--cache`, `--cache-dir` and
+        `--cache-size`
+    server : str
+        Address of a `serve` process to forward the query to
+    profile : bool or str
+        Profiling setting from `--profile` and `--profile-memory`;
+        the stages are written to standard error as set by
+        `--profile-format`
 
     Echoes
     ----
     out : str
         This is a single string that contains the n most likely
         previous words along with their frequency (separted by '\t')
-        sorted by decreasing likelihood (every pair is separated by '\n')
+        sorted by decreasing likelihood (every pair is separated by '\n').
+        When several words are given, each word's pairs follow a
+        `==> word <==` line.
 
     Example
     -------
@@ -748,6 +4651,7 @@ def likely_previous(file, word, n, clean_pg):
 
     'terms\t15\ncopies\t7\nout\t7\npart\t7\ndistribution\t5\n\n'
     """
+    targets, batch = _query_words(word, words_file, file)
     if file == '-':
         for line in stdin:
             if 'Project Gutenberg' not in line:
@@ -764,13 +4668,141 @@ def likely_previous(file, word, n, clean_pg):
                 "Path {} does not exist.".format(file)
             )
 
-    file = PGalyzer(file, clean_pg)
-    likely_previous = file.likely_previous(word, n)
-    out = []
-    for tup in likely_previous:
-        out.append(tup[0] + '\t' + str(tup[1]) + '\n')
-    out = ('').join(out)
-    click.echo(out)
+    file = _load(file, clean_pg, cache, server, profile)
+    likely = _ask(file, 'likely_previous', targets, batch, n=n,
+                  workers=workers, order=order, backoff=backoff)
+    with file.stats.stage('echo'):
+        for word, likely_previous in likely.items():
+            out = []
+            for tup in likely_previous:
+                out.append(tup[0] + '\t' + str(tup[1]) + '\n')
+            out = ('').join(out)
+            _echo_result(word, out, batch)
+    return file
+
+
+# collocations block
+@cli.command()
+@click.argument('file', type=click.Path(allow_dash=True))
+@click.option('-k', '--window', default=2, type=click.INT,
+              help='Largest distance between the two words of a pair.')
+@click.option('-m', '--measure', default='pmi',
+              type=click.Choice(COLLOCATION_MEASURES),
+              help='Collocation measure to rank the pairs by.')
+@click.option('--top', type=click.INT, default=None,
+              help='Output only the K highest ranked pairs.')
+@click.option('--min-count', type=click.INT, default=None,
+              help='Output only pairs found at least C times.')
+@click.option('-c', '--clean-pg', is_flag=True,
+              help='Flag for triggering file cleanup.')
+@_cache_options
+@_profile_options
+def collocations(file, window, measure, top, min_count, clean_pg, cache,
+                 profile):
+    """
+    Output the pairs of words found within a window of each other,
+    ranked by a collocation measure.
+
+    Parameters
+    ----------
+    file: str
+        Filepath, or `-` for standard input
+    window: int
+        Largest distance between the two words of a pair; default=2
+    measure: str
+        'pmi', 'log_likelihood' or 't_score'; default='pmi'
+    top: int
+        Number of pairs to output; default=all
+    min_count: int
+        Minimum count of the pairs to output; default=1
+    clean_pg: bool
+        Flag for cleaning the parsed file; default=False
+    cache: dict
+        On-disk cache settings from `--cache`, `--cache-dir` and
+        `--cache-size`
+    profile: bool or str
+        Profiling setting from `--profile` and `--profile-memory`;
+        the stages are written to standard error as set by
+        `--profile-format`
+
+    Echoes
+    ------
+    pairs: str
+        One pair per line: the two words separated by a space, then
+        the count and the score, separated by tab characters
+    """
+    if file == '-':
+        for line in stdin:
+            if 'Project Gutenberg' not in line:
+                raise click.ClickException("The file or content is not "
+                                           "a Project Gutenberg text "
+                                           "content file.")
+            break
+        file = (line, stdin)
+    elif not exists(file):
+        raise click.ClickException(
+            "Invalid value for file path. "
+            "Path {} does not exist.".format(file)
+        )
+
+    file = _load(file, clean_pg, cache, None, profile)
+    with file.stats.stage('query'):
+        frame = file.collocations(window, measure, top=top,
+                                  min_count=min_count)
+    with file.stats.stage('echo'):
+        _echo_lines('{} {}\t{}\t{:.6g}'.format(*row) for row in zip(
+            frame['word1'].tolist(), frame['word2'].tolist(),
+            frame['count'].tolist(), frame[measure].tolist()))
+    return file
+
+
+# serve block
+@cli.command()
+@click.option('-a', '--address', default=SERVER_ADDRESS,
+              help='HOST:PORT or Unix socket path to listen on.')
+@click.option('-m', '--max-memory', default=1024, type=click.INT,
+              help='Memory for loaded files, in MB.')
+@click.option('-r', '--root', default='.',
+              type=click.Path(exists=True, file_okay=False),
+              help='Only answer queries on files under this directory.')
+@_cache_options
+def serve(address, max_memory, root, cache):
+    """
+    Keep PGalyzer objects loaded and answer queries from other
+    processes.
+
+    Listens on `address` for JSON requests, one per line, of the form
+    `{"file": ..., "clean_pg": ..., "method": ..., "args": [...],
+    "kwargs": {...}}`, where `method` is one of the PGalyzer query
+    methods, and answers each with a line `{"result": ...}` or
+    `{"error": ..., "type": ...}`.  The other commands forward their
+    query to the server when given `--server`.
+
+    Parameters
+    ----------
+    address: str
+        HOST:PORT or Unix socket path to listen on
+    max_memory: int
+        Estimated memory, in MB, above which the least recently used
+        files are unloaded
+    root: str
+        Directory whose files may be queried (default: the current
+        directory); other paths are answered with a PermissionError
+    cache: dict
+        On-disk cache settings from `--cache`, `--cache-dir` and
+        `--cache-size`
+
+    Example
+    -------
+    $ python pgalyzer.py serve --address /tmp/pgalyzer.sock &
+    $ python pgalyzer.py likely-next --server /tmp/pgalyzer.sock \\
+          <filename> the
+    """
+    pool = _AnalyzerPool(max_memory << 20, cache, root)
+    try:
+        asyncio.run(_serve(address, pool))
+    except KeyboardInterrupt:
+        pass
 
 
 if __name__ == '__main__':
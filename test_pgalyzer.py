@@ -0,0 +1,322 @@
+"""
+Checks of the indexes of pgalyzer against brute-force baselines computed
+on small fixed texts.
+"""
+import io
+from collections import Counter
+
+import numpy as np
+import pytest
+
+import pgalyzer
+from pgalyzer import (CleaningEngine, PG_CLEANING, PGalyzer, _NgramSketch,
+                      _csr_update)
+
+
+TEXT = ('the cat sat on the mat and the cat ran\n'
+        'a dog sat on the log The cat saw the dog\n'
+        '\n'
+        'the cat sat on the mat again\n'
+        'on the mat the dog sat')
+
+APPENDED = ('the dog ran on the mat\n'
+            'zebras sat on the cat The zebra ran')
+
+PHRASES = ['the', 'the cat', 'sat on the', 'on the mat the', 'the dog sat',
+           'The cat', 'zebra', 'cat the', 'mat and the cat ran']
+
+
+def _analyzer(text):
+    """Return a PGalyzer object of `text`, read as from standard input."""
+    return PGalyzer(('', io.StringIO(text)))
+
+
+def _paragraphs(text):
+    return [line.split() for line in text.split('\n')]
+
+
+def _ngrams(text, n):
+    """Count the n-grams of each paragraph, in order of first appearance."""
+    return Counter(' '.join(words[i:i + n]) for words in _paragraphs(text)
+                   for i in range(len(words) - n + 1))
+
+
+def _ranked(counts):
+    """Rank counts as the CLI does: by count, then ignoring case."""
+    return sorted(counts.items(), key=lambda x: (-x[1], x[0].lower()))
+
+
+def _following(text, context, direction='next'):
+    """
+    Return the words found right after `context` (or right before it),
+    by decreasing count, then alphabetically.
+    """
+    k = len(context)
+    found = Counter()
+    for words in _paragraphs(text):
+        for i in range(len(words) - k):
+            if direction == 'next' and words[i:i + k] == context:
+                found[words[i + k]] += 1
+            elif direction == 'previous' and words[i + 1:i + k + 1] == context:
+                found[words[i]] += 1
+    return sorted(found.items(), key=lambda x: (-x[1], x[0]))
+
+
+def _ranked_words(text):
+    return sorted(_ngrams(text, 1).items(), key=lambda x: (-x[1], x[0]))
+
+
+def _occurrences(text, phrase, prefix=False):
+    """Return the token positions where `phrase` is found in a paragraph."""
+    *words, last = phrase.split()
+    k = len(words) + 1
+    found = []
+    start = 0
+    for paragraph in _paragraphs(text):
+        for i in range(len(paragraph) - k + 1):
+            window = paragraph[i:i + k]
+            if window[:-1] == words and (window[-1].startswith(last)
+                                         if prefix else window[-1] == last):
+                found.append(start + i)
+        start += len(paragraph)
+    return found
+
+
+def _concordance(text, word, size):
+    return [(' '.join(words[max(i - size, 0):i]),
+             ' '.join(words[i + 1:i + 1 + size]))
+            for words in _paragraphs(text)
+            for i in range(len(words)) if words[i] == word]
+
+
+def _reference_clean(text):
+    """The paragraph-at-a-time cleaning of the original PGalyzer."""
+    paragraphs = text.lower().split('\n\n')
+    for ix, paragraph in enumerate(paragraphs):
+        if paragraph.startswith(pgalyzer.PG_HEAD):
+            del paragraphs[:ix + 1]
+            break
+    for ix, paragraph in enumerate(paragraphs[::-1]):
+        if paragraph.startswith(pgalyzer.PG_FOOT):
+            del paragraphs[-(ix + 1):]
+            break
+    cleaned = []
+    for paragraph in filter(None, paragraphs):
+        paragraph = paragraph.strip('\n').replace('\n', ' ')
+        for p in pgalyzer.PUNCTUATION:
+            paragraph = paragraph.replace(p, '')
+        cleaned.append(paragraph + '\n')
+    return ''.join(cleaned).strip()
+
+
+@pytest.mark.parametrize('warm', [False, True])
+def test_append_matches_new_analyzer(warm):
+    analyzer = _analyzer(TEXT)
+    if warm:
+        # Build every index, so that append has to extend them
+        analyzer.ngrams([1, 2, 3])
+        analyzer.likely_next('the')
+        analyzer.likely_previous('the')
+        analyzer.likely_next('sat on the')
+        analyzer.concordance('the')
+        analyzer.phrase_count('the cat')
+        analyzer.cooccurrence(2)
+    analyzer.append(text=APPENDED)
+    text = TEXT + '\n' + APPENDED
+    fresh = _analyzer(text)
+    assert analyzer.text == fresh.text == text
+
+    ngrams = analyzer.ngrams([1, 2, 3])
+    assert ngrams == fresh.ngrams([1, 2, 3])
+    for n in (1, 2, 3):
+        assert ngrams[n] == _ngrams(text, n)
+        assert list(analyzer.ngrams(n, min_count=1).items()) == \
+            _ranked(_ngrams(text, n))
+
+    words = list(_ngrams(text, 1))
+    for word in words:
+        assert analyzer.concordance(word, 2) == _concordance(text, word, 2)
+        for direction in ('next', 'previous'):
+            likely = getattr(analyzer, 'likely_' + direction)
+            expected = _following(text, [word], direction)
+            if expected:
+                assert likely(word, n=len(words)) == expected
+            else:
+                with pytest.raises(KeyError):
+                    likely(word)
+    assert analyzer.likely_next('sat on the') == \
+        _following(text, ['sat', 'on', 'the'])[:5]
+    for phrase in PHRASES:
+        assert analyzer.phrase_count(phrase) == \
+            len(_occurrences(text, phrase))
+    assert analyzer.cooccurrence(2).get('the', 'mat') == \
+        fresh.cooccurrence(2).get('the', 'mat')
+
+
+def test_append_takes_a_file(tmp_path):
+    path = tmp_path / 'more.txt'
+    path.write_text(APPENDED)
+    analyzer = _analyzer(TEXT)
+    analyzer.word_count()
+    analyzer.append(str(path))
+    assert analyzer.word_count() == _ngrams(TEXT + '\n' + APPENDED, 1)
+    with pytest.raises(TypeError):
+        analyzer.append(str(path), text=APPENDED)
+    with pytest.raises(TypeError):
+        analyzer.append()
+
+
+@pytest.mark.parametrize('replace', [False, True])
+def test_csr_update(replace):
+    groups = [[1, 2], [], [3], [4, 5, 6]]
+    indptr = np.cumsum([0] + [len(g) for g in groups])
+    columns = np.array([c for g in groups for c in g])
+    keys = np.array([0, 1, 1, 3, 5, 5])
+    values = np.array([10, 11, 12, 13, 14, 15])
+
+    expected = groups + [[], []]
+    expected = [[] if replace and g in keys else list(cs)
+                for g, cs in enumerate(expected)]
+    for key, value in zip(keys.tolist(), values.tolist()):
+        expected[key].append(value)
+
+    indptr, (updated,) = _csr_update(indptr, [columns], 6, keys, [values],
+                                     replace)
+    assert [updated[a:b].tolist() for a, b in zip(indptr, indptr[1:])] == \
+        expected
+
+
+@pytest.mark.parametrize('n', [1, 2, 3])
+@pytest.mark.parametrize('min_count', [None, 2])
+def test_external_rank_matches_in_memory_rank(monkeypatch, n, min_count):
+    # Runs of one n-gram each, merged two at a time over several levels
+    monkeypatch.setattr(pgalyzer, 'MERGE_FAN_IN', 2)
+    analyzer = _analyzer(TEXT + '\n' + APPENDED)
+    expected = [x for x in _ranked(_ngrams(analyzer.text, n))
+                if min_count is None or x[1] >= min_count]
+    assert list(analyzer._ranked_ngrams(n, min_count=min_count,
+                                        sort_budget=1)) == expected
+    assert analyzer._ranked_ngrams(n, min_count=min_count) == expected
+    assert list(analyzer.ngrams(n, top=3, min_count=min_count).items()) == \
+        expected[:3]
+
+
+@pytest.mark.parametrize('direction', ['next', 'previous'])
+def test_trie_matches_context_counts(direction):
+    text = TEXT + '\n' + APPENDED
+    analyzer = _analyzer(text)
+    trie = analyzer._build_trie(direction, 3)
+    vocab = analyzer._vocab
+    words = analyzer._words
+
+    contexts = {()}
+    for k in (1, 2):
+        contexts.update(tuple(g.split()) for g in _ngrams(text, k))
+    for context in sorted(contexts):
+        expected = (_ranked_words(text) if not context
+                    else _following(text, list(context), direction))
+        ids = [vocab[w] for w in context]
+        node = trie.find(ids[::-1] if direction == 'previous' else ids)
+        assert node is not None
+        for n in (len(words), 2, -1):
+            ids, counts = trie.top(node, len(context), n)
+            assert list(zip(map(words.__getitem__, ids), counts)) == \
+                expected[:n]
+    assert trie.find([vocab['zebra'], vocab['dog']]) is None
+
+
+@pytest.mark.parametrize('window', [1, 3])
+def test_cooccurrence_matches_window_counts(window):
+    analyzer = _analyzer(TEXT)
+    expected = Counter((words[i], words[j])
+                       for words in _paragraphs(TEXT)
+                       for i in range(len(words))
+                       for j in range(i + 1, min(i + window + 1,
+                                                 len(words))))
+    matrix = analyzer.cooccurrence(window)
+    rows = matrix.rows()
+    found = {(matrix.words[r], matrix.words[c]): d for r, c, d
+             in zip(rows.tolist(), matrix.indices.tolist(),
+                    matrix.data.tolist())}
+    assert found == expected
+    for a, b in zip(matrix.indptr, matrix.indptr[1:]):
+        assert np.all(np.diff(matrix.indices[a:b]) > 0)
+    assert matrix.get('the', 'cat') == expected['the', 'cat']
+    assert matrix.get('the', 'unknown') == 0
+
+
+def _sketch(text, n, memory_budget):
+    analyzer = _analyzer(text)
+    analyzer._tokenize()
+    sketch = _NgramSketch(n, memory_budget)
+    sketch.update(analyzer._words, analyzer._tokens, analyzer._offsets)
+    return sketch
+
+
+@pytest.mark.parametrize('n', [1, 2])
+def test_sketch_merge(n):
+    expected = _ngrams(TEXT + '\n' + APPENDED, n)
+
+    # With room for every n-gram, the counts are exact
+    sketch = _sketch(TEXT, n, 1 << 20)
+    sketch.merge(_sketch(APPENDED, n, 1 << 20))
+    assert sketch.ranked() == sorted(
+        expected.items(), key=lambda x: (-x[1], x[0].lower(), x[0]))
+
+    # Otherwise they are within the bounds of the summary
+    sketch = _sketch(TEXT, n, 4096)
+    sketch.merge(_sketch(APPENDED, n, 4096))
+    assert sketch.total == sum(expected.values())
+    estimates = dict(sketch.ranked())
+    for ngram, count in estimates.items():
+        assert expected[ngram] <= count <= expected[ngram] + sketch.decrement
+    assert {g for g, t in expected.items() if t > sketch.decrement} <= \
+        set(estimates)
+
+    with pytest.raises(ValueError):
+        sketch.merge(_sketch(APPENDED, n + 1, 4096))
+
+
+@pytest.mark.parametrize('prefix', [False, True])
+def test_phrase_range_matches_scan(prefix):
+    text = TEXT + '\n' + APPENDED
+    analyzer = _analyzer(text)
+    phrases = PHRASES + ['the c', 'sat on t', 'z', 'cat zz', 'dog dog']
+    for phrase in phrases:
+        start, end = analyzer._phrase_range(phrase, prefix)
+        suffixes = analyzer._suffixes[0]
+        assert np.sort(suffixes[start:end]).tolist() == \
+            _occurrences(text, phrase, prefix)
+        assert analyzer.phrase_count(phrase, prefix) == end - start
+
+
+CLEANING_TEXTS = [
+    'Just a text.\n\nWith two paragraphs,\nand (some) punctuation!',
+    ('Header line\n*** START OF THIS PROJECT GUTENBERG EBOOK A BOOK ***\n'
+     'still the header\n\n\nBody, one.\n\n\n\nBody; two\nlines.\n\n'
+     '*** END OF THIS PROJECT GUTENBERG EBOOK A BOOK ***\nfooter\n\nend'),
+    ('*** START OF THIS PROJECT GUTENBERG EBOOK X\n\nbody\n\n'
+     '*** END OF THIS PROJECT GUTENBERG EBOOK X\n\nmore body\n\n'
+     '*** END OF THIS PROJECT GUTENBERG EBOOK X\n\nlicense'),
+    ('no header *** start of this project gutenberg ebook\n\n'
+     'text\n*** end of this project gutenberg ebook inside\n\n\n'
+     '*** end of this project gutenberg ebook\n\ngone'),
+    ('\n\n\n*** start of this project gutenberg ebook\n\n\n\n'
+     '*** start of this project gutenberg ebook again\n\nkept\n\n\n'),
+]
+
+
+@pytest.mark.parametrize('text', CLEANING_TEXTS)
+@pytest.mark.parametrize('block_size', [1, 7, 64, pgalyzer.CHUNK_SIZE])
+def test_cleaning_matches_paragraph_cleaning(text, block_size):
+    chunks = [text[i:i + 5] for i in range(0, len(text), 5)]
+    assert ''.join(PG_CLEANING.clean(chunks, block_size=block_size)) == \
+        _reference_clean(text)
+
+
+def test_cleaning_steps():
+    engine = CleaningEngine(steps=['lowercase', 'drop_punctuation'])
+    assert ''.join(engine.clean(['Hello, World!\n\nBye.'])) == \
+        'hello world\n\nbye'
+    with pytest.raises(ValueError):
+        CleaningEngine(steps=['stem'])